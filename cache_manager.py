@@ -3,12 +3,21 @@ Disk-based cache for processed JWST datasets.
 Stores FITS parsing results to speed up repeated processing.
 """
 
+import io
 import os
+import mmap
+import queue
+import atexit
 import hashlib
-import pickle
 import json
 import time
+import sqlite3
 import tempfile
+import threading
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 from pathlib import Path
 import logging
@@ -16,77 +25,293 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _json_default(obj):
+    """Let json.dump handle numpy scalars and small arrays in metadata."""
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+class _MappedFile(mmap.mmap):
+    """An mmap that reports itself seekable, which zipfile (and so np.load
+    on an .npz) requires of a file object."""
+
+    def seekable(self):
+        return True
+
+
 class DatasetCache:
-    """LRU disk cache with TTL expiration and size limits."""
+    """Disk cache with TTL expiration, size limits and LRU/MRU/S3-FIFO eviction."""
+
+    EVICTION_POLICIES = ('lru', 'mru', 's3-fifo')
 
-    def __init__(self, cache_dir=None, ttl_hours=24, max_cache_size_gb=10):
+    def __init__(self, cache_dir=None, ttl_hours=24, max_cache_size_gb=10,
+                 compress=False, eviction='lru'):
+        if eviction not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {eviction!r}; "
+                             f"expected one of {self.EVICTION_POLICIES}")
         self.cache_dir = cache_dir or os.path.join(
             tempfile.gettempdir(),
             'jwst_stamp_cache'
         )
         self.ttl_seconds = ttl_hours * 3600
         self.max_cache_bytes = max_cache_size_gb * 1024 * 1024 * 1024
+        # Deflate payloads: trades much slower writes for a smaller cache
+        self.compress = compress
 
         os.makedirs(self.cache_dir, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = self._open_index()
+        self._remove_legacy_files()
+        # In-process LRU mirror of the index: cache_key -> size, oldest first.
+        # Hits and evictions are O(1) here; SQLite remains the durable copy.
+        self._lru_lock = threading.Lock()
+        self._lru = OrderedDict(
+            self._query("SELECT cache_key, size FROM entries ORDER BY last_access ASC"))
+        self._total_size = sum(self._lru.values())
+        # S3-FIFO queues (key -> None) plus per-key hit counts and a ghost
+        # queue of recently evicted keys. Entries found at start-up go to main.
+        self.eviction = eviction
+        self._small = OrderedDict()
+        self._main = OrderedDict.fromkeys(self._lru)
+        self._ghost = OrderedDict()
+        self._freq = dict.fromkeys(self._lru, 0)
+        # cache_key -> time.monotonic() of its last write or hit, for MRU
+        self._touched = {}
+        # (path, size, mtime_ns, parameters) -> cache_key: a repeat lookup of
+        # an unchanged file is answered from one stat() without reading it.
+        # Only for full_hash=False: a full hash exists because path and
+        # mtime are not trusted. _fast_key_of is the reverse map, one fast
+        # key per entry, so replacing or dropping an entry's key is O(1).
+        self._fast_index = {
+            (path, size, mtime_ns, bool(interp), n_int, False): key
+            for key, path, size, mtime_ns, interp, n_int in self._query(
+                "SELECT cache_key, source_path, source_size, source_mtime_ns, "
+                "use_interpolation, num_integrations FROM entries "
+                "WHERE source_path IS NOT NULL AND NOT COALESCE(full_hash, 0)")
+        }
+        self._fast_key_of = {key: fk for fk, key in self._fast_index.items()}
+        # Payload writes happen on a background thread; until a write lands,
+        # get() serves the serialized bytes from _pending, stored per key as
+        # (payload, time of set()).
+        self._pending = {}
+        self._pending_bytes = 0
+        self._pending_lock = threading.Lock()
+        # Hit stats not yet written to the index: cache_key -> [last_access, hits]
+        self._access_dirty = {}
+        self._writer_q = queue.Queue()
+        threading.Thread(target=self._writer_loop, name='cache-writer', daemon=True).start()
+        atexit.register(self.flush)
         logger.info(f"Cache initialized: {self.cache_dir} "
-                    f"(TTL: {ttl_hours}h, Max size: {max_cache_size_gb}GB)")
+                    f"(TTL: {ttl_hours}h, Max size: {max_cache_size_gb}GB, "
+                    f"Eviction: {eviction})")
+
+    INDEX_FILE = 'index.sqlite3'
+    # Serialized payloads held in memory until written; past this a set()
+    # writes its own temp file and queues only the rename and index update
+    PENDING_MAX_BYTES = 512 << 20  # 512 MB
+    ACCESS_FLUSH_SECONDS = 30
+
+    def _open_index(self):
+        """Open (creating if needed) the SQLite index of cache entries."""
+        db = sqlite3.connect(os.path.join(self.cache_dir, self.INDEX_FILE),
+                             isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " cache_key TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " timestamp REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " access_count INTEGER NOT NULL DEFAULT 0,"
+            " original_file TEXT,"
+            " use_interpolation INTEGER,"
+            " data_info TEXT)"
+        )
+        # Source-file identity for the stat()-only fast path in get()
+        existing = {row[1] for row in db.execute("PRAGMA table_info(entries)")}
+        for column, sqltype in (('source_path', 'TEXT'), ('source_size', 'INTEGER'),
+                                ('source_mtime_ns', 'INTEGER'), ('num_integrations', 'INTEGER'),
+                                ('full_hash', 'INTEGER')):
+            if column not in existing:
+                db.execute(f"ALTER TABLE entries ADD COLUMN {column} {sqltype}")
+        db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        return db
+
+    def _query(self, sql, params=()):
+        """Run one statement on the shared connection and return all rows."""
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    STALE_TMP_SECONDS = 3600
+
+    def _remove_legacy_files(self):
+        """Delete pickle payloads and JSON sidecars from older cache versions,
+        and partial writes left by a crash.
+
+        Their keys can no longer be produced, so they would only take up disk.
+        A ``.tmp`` file is only removed once it is an hour old: a fresh one
+        may be a write in flight from another process sharing the directory.
+        """
+        cutoff = time.time() - self.STALE_TMP_SECONDS
+        for fname in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, fname)
+            try:
+                if fname.endswith(('.pkl', '_meta.json')):
+                    os.remove(path)
+                elif fname.endswith('.tmp') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
 
     FINGERPRINT_BYTES = 65536  # 64 KB
-
-    def _compute_hash(self, file_path, use_interpolation, num_integrations=None):
-        """Compute a unique hash based on file content fingerprint and parameters."""
-        hasher = hashlib.sha256()
-        file_size = os.path.getsize(file_path)
-        hasher.update(str(file_size).encode())
-        with open(file_path, 'rb') as f:
-            head = f.read(self.FINGERPRINT_BYTES)
-            hasher.update(head)
-            if file_size > self.FINGERPRINT_BYTES * 2:
-                f.seek(-self.FINGERPRINT_BYTES, 2)
-                hasher.update(f.read())
+    HASH_CHUNK_BYTES = 1 << 20  # 1 MB
+    PARALLEL_HASH_CHUNK_BYTES = 8 << 20  # 8 MB
+    PARALLEL_HASH_MIN_BYTES = 64 << 20  # 64 MB
+
+    def _compute_hash(self, file_path, use_interpolation, num_integrations=None,
+                      full_hash=False):
+        """Compute a cache key from a file fingerprint and parameters.
+
+        By default the fingerprint is size + mtime + the first and last 64 KB,
+        which is constant-time regardless of file size. Pass ``full_hash=True``
+        for freshly uploaded files, whose mtime says nothing about content;
+        for ZIP archives that hashes the central directory (name, CRC-32 and
+        size of every member) rather than the whole archive.
+        """
+        st = os.stat(file_path)
+        file_size = st.st_size
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(self._file_digest(file_path, file_size, st.st_mtime_ns, full_hash))
         hasher.update(str(use_interpolation).encode())
+        hasher.update(str(num_integrations).encode())
         cache_key = hasher.hexdigest()
         logger.info(f"Cache key: {cache_key[:16]}... | File: {os.path.basename(file_path)} | "
                     f"Size: {file_size / 1024 / 1024:.2f} MB | Interpolation: {use_interpolation}")
         return cache_key
 
-    def _get_cache_path(self, cache_key):
-        return os.path.join(self.cache_dir, f"{cache_key}.pkl")
+    @classmethod
+    @lru_cache(maxsize=256)
+    def _file_digest(cls, file_path, file_size, mtime_ns, full_hash):
+        """Digest of a file's fingerprint, memoised on (path, size, mtime).
+
+        get() and set() for the same job then read the file only once; any
+        rewrite of the file changes size or mtime and so misses the memo.
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(file_size.to_bytes(8, 'little'))
+        members = cls._zip_members(file_path) if full_hash else None
+        if members is not None:
+            hasher.update(repr(members).encode())
+        elif full_hash and file_size > cls.PARALLEL_HASH_MIN_BYTES:
+            cls._hash_chunks_parallel(file_path, hasher)
+        elif full_hash:
+            # Unbuffered reads into one reusable buffer: no per-chunk allocation
+            buf = memoryview(bytearray(cls.HASH_CHUNK_BYTES))
+            with open(file_path, 'rb', buffering=0) as f:
+                while n := f.readinto(buf):
+                    hasher.update(buf[:n])
+        else:
+            hasher.update(mtime_ns.to_bytes(8, 'little'))
+            with open(file_path, 'rb') as f:
+                hasher.update(f.read(cls.FINGERPRINT_BYTES))
+                if file_size > cls.FINGERPRINT_BYTES * 2:
+                    f.seek(-cls.FINGERPRINT_BYTES, 2)
+                    hasher.update(f.read())
+        return hasher.digest()
+
+    @staticmethod
+    def _zip_members(file_path):
+        """(name, CRC-32, size) of every member of a ZIP, or None if not a ZIP.
+
+        Only the central directory at the end of the archive is read, and the
+        per-member CRCs identify the content as well as hashing every byte.
+        """
+        try:
+            with zipfile.ZipFile(file_path) as z:
+                return [(i.filename, i.CRC, i.file_size) for i in z.infolist()]
+        except (zipfile.BadZipFile, OSError):
+            return None
 
-    def _get_metadata_path(self, cache_key):
-        return os.path.join(self.cache_dir, f"{cache_key}_meta.json")
+    @classmethod
+    def _hash_chunks_parallel(cls, file_path, hasher):
+        """Feed ``hasher`` the in-order digests of fixed-size chunks of a file.
+
+        Chunks are hashed on a thread pool (hashlib releases the GIL on large
+        buffers) while this thread keeps reading. At most two chunks per
+        worker are in flight, which bounds memory.
+        """
+        workers = os.cpu_count() or 1
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                open(file_path, 'rb') as f:
+            while chunk := f.read(cls.PARALLEL_HASH_CHUNK_BYTES):
+                if len(pending) >= 2 * workers:
+                    hasher.update(pending.popleft().result())
+                pending.append(pool.submit(
+                    lambda b: hashlib.blake2b(b, digest_size=16).digest(), chunk))
+            while pending:
+                hasher.update(pending.popleft().result())
+
+    @staticmethod
+    def _fast_key(file_path, use_interpolation, num_integrations, full_hash):
+        st = os.stat(file_path)
+        return (os.path.abspath(file_path), st.st_size, st.st_mtime_ns,
+                bool(use_interpolation), num_integrations, bool(full_hash))
 
-    def get(self, file_path, use_interpolation, num_integrations=None):
+    def _get_cache_path(self, cache_key):
+        return os.path.join(self.cache_dir, f"{cache_key}.npz")
+
+    def get(self, file_path, use_interpolation, num_integrations=None, full_hash=False):
         """Retrieve cached data if available and valid. Returns dict or None."""
         try:
-            cache_key = self._compute_hash(file_path, use_interpolation, num_integrations)
+            cache_key = None
+            if not full_hash:
+                fast_key = self._fast_key(file_path, use_interpolation, num_integrations, full_hash)
+                with self._lru_lock:
+                    cache_key = self._fast_index.get(fast_key)
+            if cache_key is None:
+                cache_key = self._compute_hash(file_path, use_interpolation,
+                                               num_integrations, full_hash)
             cache_path = self._get_cache_path(cache_key)
-            meta_path = self._get_metadata_path(cache_key)
-
-            if not os.path.exists(cache_path) or not os.path.exists(meta_path):
-                logger.info(f"Cache miss: key {cache_key[:12]}...not found")
-                return None
 
-            with open(meta_path, 'r') as f:
-                metadata = json.load(f)
-
-            age = time.time() - metadata['timestamp']
+            with self._pending_lock:
+                pending = self._pending.get(cache_key)
+            if pending is not None:
+                payload, timestamp = pending
+                size = payload.nbytes
+            else:
+                rows = self._query(
+                    "SELECT timestamp, size FROM entries WHERE cache_key = ?", (cache_key,))
+                if not rows or not os.path.exists(cache_path):
+                    logger.info(f"Cache miss: key {cache_key[:12]}...not found")
+                    return None
+                timestamp, size = rows[0]
+
+            age = time.time() - timestamp
             if age > self.ttl_seconds:
                 logger.info(f"Cache expired: key {cache_key[:12]}..."
                             f"(age: {age / 3600:.1f}h > {self.ttl_seconds / 3600:.1f}h)")
-                self._remove_entry(cache_key)
+                if pending is None:
+                    # A pending entry is left to its write; the next get
+                    # finds it on disk and removes it there
+                    self._remove_entry(cache_key)
                 return None
 
             logger.info(f"Cache HIT: key {cache_key[:12]}..."
-                        f"(age: {age / 60:.1f}m, size: {metadata['size'] / 1024 / 1024:.1f}MB)")
+                        f"(age: {age / 60:.1f}m, size: {size / 1024 / 1024:.1f}MB"
+                        f"{', write pending' if pending is not None else ''})")
 
-            with open(cache_path, 'rb') as f:
-                data = pickle.load(f)
+            data = None
+            if pending is not None:
+                data = self._load_payload(io.BytesIO(payload))
+            elif size >= self.DIRECT_READ_MIN_BYTES:
+                data = self._read_direct(cache_path, size)
+            if data is None:
+                data = self._load_payload(cache_path)
 
-            metadata['last_access'] = time.time()
-            metadata['access_count'] = metadata.get('access_count', 0) + 1
-            with open(meta_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            self._track_hit(cache_key)
 
             return data
 
@@ -94,101 +319,348 @@ class DatasetCache:
             logger.error(f"Error reading cache: {e}", exc_info=True)
             return None
 
-    def set(self, file_path, use_interpolation, data, num_integrations=None):
-        """Store processed data in cache."""
+    def set(self, file_path, use_interpolation, data, num_integrations=None,
+            full_hash=False):
+        """Store processed data in cache.
+
+        The payload is serialized here, so later changes to ``data`` are not
+        seen; the disk write and index update happen on the writer thread.
+        Payloads waiting for that write are bounded by PENDING_MAX_BYTES;
+        beyond it the file is written here and only indexed in the background.
+        """
         try:
-            cache_key = self._compute_hash(file_path, use_interpolation, num_integrations)
-            cache_path = self._get_cache_path(cache_key)
-            meta_path = self._get_metadata_path(cache_key)
+            fast_key = self._fast_key(file_path, use_interpolation, num_integrations, full_hash)
+            cache_key = self._compute_hash(file_path, use_interpolation,
+                                           num_integrations, full_hash)
 
             logger.info(f"Caching data for key {cache_key[:12]}...")
-            with open(cache_path, 'wb') as f:
-                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
-
-            file_size = os.path.getsize(cache_path)
-            metadata = {
-                'timestamp': time.time(),
-                'last_access': time.time(),
-                'access_count': 0,
-                'cache_key': cache_key,
-                'size': file_size,
-                'original_file': os.path.basename(file_path),
-                'use_interpolation': use_interpolation,
-                'data_info': {
-                    'wavelength_points': len(data.get('wavelength_1d', [])),
-                    'time_points': len(data.get('time_1d', [])),
-                    'total_integrations': data.get('metadata', {}).get('total_integrations', 'unknown')
-                }
+            buf = io.BytesIO()
+            self._save_payload(buf, data)
+            payload = buf.getbuffer()  # view of buf's storage, not a copy
+
+            data_info = {
+                'wavelength_points': len(data.get('wavelength_1d', [])),
+                'time_points': len(data.get('time_1d', [])),
+                'total_integrations': data.get('metadata', {}).get('total_integrations', 'unknown')
             }
-
-            with open(meta_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
-
-            logger.info(f"Cached successfully: {file_size / 1024 / 1024:.1f} MB "
-                        f"({metadata['data_info']['wavelength_points']} wavelengths, "
-                        f"{metadata['data_info']['time_points']} time points)")
-
-            self._enforce_size_limit()
+            with self._pending_lock:
+                spill = self._pending_bytes + payload.nbytes > self.PENDING_MAX_BYTES
+                if not spill:
+                    self._pending[cache_key] = (payload, time.time())
+                    self._pending_bytes += payload.nbytes
+            if spill:
+                # Queue the temp file's path instead of the bytes
+                payload = self._write_tmp(payload)
+                del buf
+            self._writer_q.put((cache_key, payload, fast_key, data_info))
 
         except Exception as e:
             logger.error(f"Error writing cache: {e}", exc_info=True)
 
+    def flush(self):
+        """Block until every queued cache write and hit stat has reached disk."""
+        self._writer_q.join()
+        self._flush_access_stats()
+
+    def _flush_access_stats(self):
+        """Write batched last_access/access_count updates in one transaction."""
+        with self._lru_lock:
+            dirty, self._access_dirty = self._access_dirty, {}
+        if not dirty:
+            return
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "UPDATE entries SET last_access = ?, access_count = access_count + ? "
+                    "WHERE cache_key = ?",
+                    [(last_access, hits, key) for key, (last_access, hits) in dirty.items()])
+                self._db.execute("COMMIT")
+            except Exception:
+                # Never leave the autocommit connection inside a transaction:
+                # every later _query would silently go uncommitted
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                self._requeue_access_stats(dirty)
+                raise
+
+    def _requeue_access_stats(self, dirty):
+        """Merge stats from a failed flush back so the next one retries them."""
+        with self._lru_lock:
+            for key, (last_access, hits) in dirty.items():
+                rec = self._access_dirty.setdefault(key, [0.0, 0])
+                rec[0] = max(rec[0], last_access)
+                rec[1] += hits
+
+    def _writer_loop(self):
+        while True:
+            try:
+                job = self._writer_q.get(timeout=self.ACCESS_FLUSH_SECONDS)
+            except queue.Empty:
+                # Idle: persist hit stats batched since the last flush
+                try:
+                    self._flush_access_stats()
+                except Exception as e:
+                    logger.error(f"Error writing cache access stats: {e}", exc_info=True)
+                continue
+            try:
+                self._write_entry(*job)
+            except Exception as e:
+                logger.error(f"Error writing cache: {e}", exc_info=True)
+            finally:
+                self._writer_q.task_done()
+
+    def _write_tmp(self, payload):
+        """Write ``payload`` to a uniquely named temp file in the cache dir."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _write_entry(self, cache_key, payload, fast_key, data_info):
+        """Write one serialized payload and index it (writer thread only).
+
+        ``payload`` is the serialized bytes, or the path of a temp file that
+        set() already wrote when the pending budget was full.
+        """
+        cache_path = self._get_cache_path(cache_key)
+        spilled = isinstance(payload, str)
+        try:
+            tmp_path = payload if spilled else self._write_tmp(payload)
+            file_size = os.path.getsize(tmp_path)
+            # Readers never see a partially written payload
+            os.replace(tmp_path, cache_path)
+
+            now = time.time()
+            # Hits served from _pending before the row existed
+            with self._lru_lock:
+                early = self._access_dirty.pop(cache_key, None)
+            last_access, hits = early if early is not None else (now, 0)
+            source_path, source_size, source_mtime_ns, use_interpolation, num_integrations, full_hash = fast_key
+            self._query(
+                "INSERT OR REPLACE INTO entries (cache_key, size, timestamp, last_access, "
+                "access_count, original_file, use_interpolation, data_info, source_path, "
+                "source_size, source_mtime_ns, num_integrations, full_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, file_size, now, last_access, hits, os.path.basename(source_path),
+                 int(use_interpolation), json.dumps(data_info, default=_json_default),
+                 source_path, source_size, source_mtime_ns, num_integrations, int(full_hash)))
+            self._track_insert(cache_key, file_size, None if full_hash else fast_key, hits)
+        finally:
+            if not spilled:
+                with self._pending_lock:
+                    self._pending_bytes -= payload.nbytes
+                    if self._pending.get(cache_key, (None,))[0] is payload:
+                        del self._pending[cache_key]
+
+        logger.info(f"Cached successfully: {file_size / 1024 / 1024:.1f} MB "
+                    f"({data_info['wavelength_points']} wavelengths, "
+                    f"{data_info['time_points']} time points)")
+
+        self._enforce_size_limit(keep=cache_key)
+
+    PAYLOAD_JSON_KEY = '__json__'
+
+    def _save_payload(self, file, data):
+        """Write arrays as raw .npy members of an .npz; everything else as JSON.
+
+        Unlike pickle, loading needs no Python object reconstruction and can
+        never execute code from the cache directory.
+        """
+        arrays = {k: v for k, v in data.items() if isinstance(v, np.ndarray)}
+        extras = {k: v for k, v in data.items() if k not in arrays}
+        arrays[self.PAYLOAD_JSON_KEY] = np.array(json.dumps(extras, default=_json_default))
+        save = np.savez_compressed if self.compress else np.savez
+        save(file, **arrays)
+
+    def _load_payload(self, file):
+        """Inverse of _save_payload."""
+        with np.load(file, allow_pickle=False) as npz:
+            data = {k: npz[k] for k in npz.files}
+        data.update(json.loads(str(data.pop(self.PAYLOAD_JSON_KEY))))
+        return data
+
+    DIRECT_READ_MIN_BYTES = 10 << 20  # 10 MB
+    DIRECT_READ_CHUNK_BYTES = 16 << 20  # 16 MB
+
+    def _read_direct(self, path, size):
+        """Load a large payload with O_DIRECT, bypassing the page cache.
+
+        A payload is read once per hit and then lives in Python memory, so
+        keeping a second copy in the page cache only crowds out other
+        processes. The file is read into an anonymous mapping and np.load
+        parses it in place, so the arrays are the only copy made. Returns
+        the loaded dict, or None where O_DIRECT is unsupported (non-Linux,
+        tmpfs, some network filesystems) so the caller can fall back to a
+        buffered read.
+        """
+        o_direct = getattr(os, 'O_DIRECT', 0)
+        if not o_direct:
+            return None
+        try:
+            fd = os.open(path, os.O_RDONLY | o_direct)
+        except OSError:
+            return None
+        try:
+            # Anonymous mmaps are page-aligned, as O_DIRECT requires
+            aligned = -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+            with _MappedFile(-1, aligned) as buf:
+                with memoryview(buf) as view:
+                    offset = 0
+                    while offset < size:
+                        n = os.preadv(fd, [view[offset:offset + self.DIRECT_READ_CHUNK_BYTES]], offset)
+                        if n == 0:
+                            break
+                        offset += n
+                if offset != size:
+                    return None
+                # The zero padding past ``size`` is ignored by zipfile
+                return self._load_payload(buf)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
     def _remove_entry(self, cache_key):
-        """Remove a cache entry (data + metadata files)."""
+        """Remove a cache entry (payload file + index row)."""
         try:
             cache_path = self._get_cache_path(cache_key)
-            meta_path = self._get_metadata_path(cache_key)
-
             if os.path.exists(cache_path):
                 os.remove(cache_path)
                 logger.debug(f"Removed cache data: {cache_key[:12]}...")
-
-            if os.path.exists(meta_path):
-                os.remove(meta_path)
-                logger.debug(f"Removed cache metadata: {cache_key[:12]}...")
+            self._query("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+            self._track_remove(cache_key)
 
         except Exception as e:
             logger.error(f"Error removing cache entry {cache_key[:12]}...: {e}")
 
-    def _enforce_size_limit(self):
-        """Remove oldest entries if total size exceeds limit (LRU eviction)."""
-        try:
-            entries = []
-            for fname in os.listdir(self.cache_dir):
-                if fname.endswith('_meta.json'):
-                    meta_path = os.path.join(self.cache_dir, fname)
-                    try:
-                        with open(meta_path, 'r') as f:
-                            metadata = json.load(f)
-                        entries.append(metadata)
-                    except Exception as e:
-                        logger.warning(f"Could not read metadata {fname}: {e}")
+    # S3-FIFO: new entries enter a small probationary queue sized to 10% of
+    # the cache; only entries hit while there are promoted to the main queue.
+    # A one-off upload is therefore evicted before anything re-used.
+    S3_SMALL_FRACTION = 0.1
+    S3_MAX_FREQ = 3
+
+    # MRU never picks an entry written or hit this recently, unless nothing
+    # older is left: it is most likely in use by a running job
+    MRU_RECENT_SECONDS = 60
+
+    def _track_insert(self, cache_key, size, fast_key=None, hits=0):
+        with self._lru_lock:
+            self._touched[cache_key] = time.monotonic()
+            if fast_key is not None:
+                old = self._fast_key_of.get(cache_key)
+                if old is not None and self._fast_index.get(old) == cache_key:
+                    del self._fast_index[old]
+                previous_owner = self._fast_index.get(fast_key)
+                if previous_owner is not None:
+                    self._fast_key_of.pop(previous_owner, None)
+                self._fast_index[fast_key] = cache_key
+                self._fast_key_of[cache_key] = fast_key
+            self._total_size += size - self._lru.pop(cache_key, 0)
+            self._lru[cache_key] = size
+            if cache_key not in self._small and cache_key not in self._main:
+                if cache_key in self._ghost:
+                    del self._ghost[cache_key]
+                    self._main[cache_key] = None
+                else:
+                    self._small[cache_key] = None
+            self._freq[cache_key] = min(hits, self.S3_MAX_FREQ)
+
+    def _track_hit(self, cache_key):
+        with self._lru_lock:
+            rec = self._access_dirty.setdefault(cache_key, [0.0, 0])
+            rec[0] = time.time()
+            rec[1] += 1
+            if cache_key in self._lru:
+                self._touched[cache_key] = time.monotonic()
+                self._lru.move_to_end(cache_key)
+                self._freq[cache_key] = min(self._freq[cache_key] + 1, self.S3_MAX_FREQ)
+
+    def _track_remove(self, cache_key):
+        with self._lru_lock:
+            self._total_size -= self._lru.pop(cache_key, 0)
+            self._small.pop(cache_key, None)
+            self._main.pop(cache_key, None)
+            self._freq.pop(cache_key, None)
+            self._touched.pop(cache_key, None)
+            self._access_dirty.pop(cache_key, None)
+            fast_key = self._fast_key_of.pop(cache_key, None)
+            if fast_key is not None and self._fast_index.get(fast_key) == cache_key:
+                del self._fast_index[fast_key]
+
+    def _pick_victim(self, keep=None):
+        """Choose the next entry to evict under the configured policy.
+
+        ``keep`` (the entry just written) is never chosen, and MRU skips
+        entries touched in the last MRU_RECENT_SECONDS while older ones
+        remain. Returns None when nothing else is left to evict.
+        """
+        with self._lru_lock:
+            if self.eviction == 'lru':
+                return next((k for k in self._lru if k != keep), None)
+            if self.eviction == 'mru':
+                cutoff = time.monotonic() - self.MRU_RECENT_SECONDS
+                candidates = [k for k in reversed(self._lru) if k != keep]
+                return next(
+                    (k for k in candidates if self._touched.get(k, 0.0) < cutoff),
+                    candidates[-1] if candidates else None)
+
+            small_limit = self.max_cache_bytes * self.S3_SMALL_FRACTION
+            for _ in range(len(self._lru) * (self.S3_MAX_FREQ + 1) + 1):
+                small = [k for k in self._small if k != keep]
+                main = [k for k in self._main if k != keep]
+                if not small and not main:
+                    return None
+                small_size = sum(self._lru[k] for k in self._small)
+                if small and (small_size >= small_limit or not main):
+                    key = small[0]
+                    del self._small[key]
+                    if self._freq[key] > 0:
+                        self._main[key] = None
+                        self._freq[key] = 0
                         continue
+                    self._ghost[key] = None
+                    while len(self._ghost) > max(len(self._lru), 1):
+                        self._ghost.popitem(last=False)
+                    return key
+                key = main[0]
+                if self._freq[key] > 0:
+                    self._freq[key] -= 1
+                    self._main.move_to_end(key)
+                    continue
+                return key
+            return None
 
-            total_size = sum(e['size'] for e in entries)
+    def _enforce_size_limit(self, keep=None):
+        """Evict entries under the configured policy while over the size limit."""
+        try:
+            if self._total_size <= self.max_cache_bytes:
+                return
 
-            if total_size > self.max_cache_bytes:
-                logger.warning(
-                    f"Cache size {total_size / 1024 / 1024 / 1024:.2f} GB exceeds "
-                    f"limit of {self.max_cache_bytes / 1024 / 1024 / 1024:.2f} GB."
-                    f"Removing oldest entries..."
-                )
-
-                entries.sort(key=lambda e: e.get('last_access', 0))
-                target_size = self.max_cache_bytes * 0.8
-                removed_count = 0
-
-                for entry in entries:
-                    if total_size <= target_size:
-                        break
-                    self._remove_entry(entry['cache_key'])
-                    total_size -= entry['size']
-                    removed_count += 1
+            logger.warning(
+                f"Cache size {self._total_size / 1024 / 1024 / 1024:.2f} GB exceeds "
+                f"limit of {self.max_cache_bytes / 1024 / 1024 / 1024:.2f} GB."
+                f"Removing {self.eviction.upper()} entries..."
+            )
 
-                logger.info(
-                    f"Cache cleanup complete: removed {removed_count} entries, "
-                    f"new size: {total_size / 1024 / 1024 / 1024:.2f} GB"
-                )
+            target_size = self.max_cache_bytes * 0.8
+            removed_count = 0
+
+            while self._total_size > target_size:
+                cache_key = self._pick_victim(keep)
+                if cache_key is None:
+                    break
+                self._remove_entry(cache_key)
+                removed_count += 1
+
+            logger.info(
+                f"Cache cleanup complete: removed {removed_count} entries, "
+                f"new size: {self._total_size / 1024 / 1024 / 1024:.2f} GB"
+            )
 
         except Exception as e:
             logger.error(f"Error enforcing cache size limit: {e}", exc_info=True)
@@ -196,12 +668,22 @@ class DatasetCache:
     def clear(self):
         """Clear all cache entries."""
         try:
+            self.flush()
             removed_count = 0
             for fname in os.listdir(self.cache_dir):
                 fpath = os.path.join(self.cache_dir, fname)
+                if fname.startswith(self.INDEX_FILE):
+                    continue
                 if os.path.isfile(fpath):
                     os.remove(fpath)
                     removed_count += 1
+            self._query("DELETE FROM entries")
+            with self._lru_lock:
+                for index in (self._lru, self._small, self._main, self._ghost,
+                              self._freq, self._touched, self._fast_index,
+                              self._fast_key_of, self._access_dirty):
+                    index.clear()
+                self._total_size = 0
 
             logger.info(f"Cache cleared: {removed_count} files removed")
             return removed_count
@@ -213,16 +695,25 @@ class DatasetCache:
     def get_stats(self):
         """Get cache statistics."""
         try:
-            entries = []
-            for fname in os.listdir(self.cache_dir):
-                if fname.endswith('_meta.json'):
-                    meta_path = os.path.join(self.cache_dir, fname)
-                    try:
-                        with open(meta_path, 'r') as f:
-                            metadata = json.load(f)
-                        entries.append(metadata)
-                    except Exception:
-                        continue
+            self.flush()
+            rows = self._query(
+                "SELECT cache_key, size, timestamp, last_access, access_count, "
+                "original_file, use_interpolation, data_info "
+                "FROM entries ORDER BY last_access DESC")
+            entries = [
+                {
+                    'cache_key': key,
+                    'size': size,
+                    'timestamp': timestamp,
+                    'last_access': last_access,
+                    'access_count': access_count,
+                    'original_file': original_file,
+                    'use_interpolation': bool(use_interpolation),
+                    'data_info': json.loads(data_info) if data_info else {},
+                }
+                for (key, size, timestamp, last_access, access_count,
+                     original_file, use_interpolation, data_info) in rows
+            ]
 
             total_size = sum(e['size'] for e in entries)
 
@@ -233,9 +724,7 @@ class DatasetCache:
                 'max_size_gb': self.max_cache_bytes / 1024 / 1024 / 1024,
                 'ttl_hours': self.ttl_seconds / 3600,
                 'cache_dir': self.cache_dir,
-                'entries': sorted(entries,
-                                  key=lambda e: e.get('last_access', 0),
-                                  reverse=True)
+                'entries': entries
             }
 
         except Exception as e:
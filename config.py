@@ -3,9 +3,19 @@ Configuration, constants, and YAML config loader for STAMP.
 """
 
 import os
+import copy
+import types
 import logging
+import threading
+from collections import OrderedDict
+
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml bindings
+except ImportError:
+    from yaml import SafeLoader
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 logging.basicConfig(
@@ -20,22 +30,45 @@ COLOR_SCALES = [
 ]
 
 
+_CONFIG_CACHE_MAX = 100
+_config_cache = OrderedDict()  # abspath -> (mtime_ns, size, parsed)
+_config_cache_lock = threading.Lock()
+
+
 def load_config(config_file='config.yaml'):
-    """Load settings from a YAML config file. Returns {} on failure."""
+    """Load settings from a YAML config file. Returns {} on failure.
+
+    Parsed results are memoised per path and revalidated against the
+    file's (mtime_ns, size); callers get a deep copy they may mutate.
+    """
     try:
-        cfg_path = (
+        cfg_path = os.path.abspath(
             config_file
             if os.path.isabs(config_file)
             else os.path.join(BASE_DIR, config_file)
         )
+        st = os.stat(cfg_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with _config_cache_lock:
+            hit = _config_cache.get(cfg_path)
+            if hit is not None and hit[:2] == stamp:
+                _config_cache.move_to_end(cfg_path)
+                return copy.deepcopy(hit[2])
         with open(cfg_path, 'r') as f:
-            return yaml.safe_load(f) or {}
+            parsed = yaml.load(f, Loader=SafeLoader) or {}
+        with _config_cache_lock:
+            _config_cache[cfg_path] = (*stamp, parsed)
+            _config_cache.move_to_end(cfg_path)
+            while len(_config_cache) > _CONFIG_CACHE_MAX:
+                _config_cache.popitem(last=False)
+        return copy.deepcopy(parsed)
     except Exception as e:
         logger.warning(f"Error loading configuration: {str(e)}. Using default values.")
         return {}
 
 
-CONFIG = load_config()
+# Parsed once at import; read-only so nothing can come to depend on mutating it
+CONFIG = types.MappingProxyType(load_config())
 DATA_DIR = CONFIG.get('data_dir', 'Data')
 GRIDS_DIR = os.environ.get('GRIDS_DIR', os.path.join(BASE_DIR, 'model_grids'))
 DEMO_DATA_DIR = os.environ.get('DEMO_DATA_DIR', os.path.join(BASE_DIR, 'static', 'demo_data'))
@@ -4,75 +4,253 @@ File I/O for JWST spectral data (FITS and HDF5 formats).
 
 import os
 import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 import numpy as np
 from astropy.io import fits
-from astropy.time import Time
 import h5py
 
+try:
+    import fitsio  # CFITSIO bindings: reads one table cell without an HDUList
+except ImportError:
+    fitsio = None
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class SpectralBlock:
+    """The integrations loaded from one file, stored column-wise.
+
+    Row ``i`` of ``flux2d``/``errors2d`` is the spectrum taken at ``times[i]``
+    (MJD). ``wavelength`` is either one grid shared by every row or a 2-D
+    array with a grid per row. ``valid`` flags the points that passed the
+    finite-value check; None means every point is used. Files without
+    uncertainties get a read-only all-NaN ``errors2d`` view.
+    """
+    wavelength: np.ndarray
+    flux2d: np.ndarray
+    errors2d: np.ndarray
+    times: np.ndarray
+    valid: np.ndarray = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def row(self, i):
+        """Return (wavelength, flux, error) of integration ``i``, masked."""
+        wl = self.wavelength if self.wavelength.ndim == 1 else self.wavelength[i]
+        f, e = self.flux2d[i], self.errors2d[i]
+        if self.valid is None:
+            return wl, f, e
+        m = self.valid[i]
+        return wl[m], f[m], e[m]
+
+    def point_counts(self):
+        """Number of usable points in each row."""
+        if self.valid is None:
+            return np.full(len(self), self.flux2d.shape[1])
+        return self.valid.sum(axis=1)
+
+    def wavelength_overlap(self):
+        """(lo, hi) of the wavelength range covered by every row."""
+        if self.valid is None and self.wavelength.ndim == 1:
+            return np.min(self.wavelength), np.max(self.wavelength)
+        wl = np.broadcast_to(self.wavelength, self.flux2d.shape)
+        if self.valid is None:
+            return np.max(np.min(wl, axis=1)), np.min(np.max(wl, axis=1))
+        lo = np.where(self.valid, wl, np.inf).min(axis=1)
+        hi = np.where(self.valid, wl, -np.inf).max(axis=1)
+        return lo.max(), hi.min()
+
+
+def _missing_errors(flux2d):
+    """Read-only all-NaN errors shaped like ``flux2d``, with no allocation."""
+    return np.broadcast_to(np.array(np.nan, dtype=flux2d.dtype), flux2d.shape)
+
+
+def _block_from_rows(wl_rows, flux_rows, err_rows, valid_rows, times):
+    """Pack ragged per-integration rows into a NaN-padded SpectralBlock.
+    Rows of ``err_rows`` may be None where a file has no error column."""
+    width = max(len(r) for r in flux_rows)
+
+    def pack(rows, fill):
+        rows_present = [r for r in rows if r is not None]
+        if not rows_present:
+            return None
+        dtypes = {r.dtype for r in rows_present}
+        dtype = rows_present[0].dtype if len(dtypes) == 1 else np.result_type(*dtypes)
+        out = np.full((len(rows), width), fill, dtype=dtype)
+        for dst, r in zip(out, rows):
+            if r is not None:
+                dst[:len(r)] = r
+        return out
+
+    flux2d = pack(flux_rows, np.nan)
+    errors2d = pack(err_rows, np.nan)
+    return SpectralBlock(
+        wavelength=pack(wl_rows, np.nan),
+        flux2d=flux2d,
+        errors2d=errors2d if errors2d is not None else _missing_errors(flux2d),
+        times=np.asarray(times, dtype=float),
+        valid=pack(valid_rows, False),
+    )
+
+
 def _first_key(group, *candidates):
-    """Return the first key from candidates that exists in group, or None."""
-    for k in candidates:
-        if k in group:
-            return k
+    """Return the first key from candidates that exists in group, or None.
+
+    ``group`` may be an h5py group or a set of its member names; pass the
+    set when probing the same group repeatedly.
+    """
+    names = group if isinstance(group, (set, frozenset)) else set(group.keys())
+    return next((k for k in candidates if k in names), None)
+
+
+def extract_spectral_files(zip_path, dest_dir):
+    """Extract only the FITS/H5 members of a ZIP archive into dest_dir.
+    Returns the extracted file paths; other members are never written.
+    """
+    paths = []
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for member in zip_ref.infolist():
+            if member.is_dir():
+                continue
+            name = member.filename
+            # macOS archives carry '__MACOSX/._x.fits' resource forks that
+            # share the extension but are not FITS/H5
+            if '__MACOSX/' in name or os.path.basename(name).startswith('._'):
+                continue
+            if name.lower().endswith(('.fits', '.h5')):
+                paths.append(zip_ref.extract(member, dest_dir))
+    return paths
+
+
+def read_start_time(fp):
+    """Return the first integration time of a FITS/H5 file, or None.
+
+    Only the INT_TIMES table (one row via fitsio when it is installed,
+    otherwise memory-mapped by astropy) or the first H5 time sample is
+    read; the spectra themselves are not touched.
+    """
+    try:
+        if fp.endswith('.fits'):
+            if fitsio is not None:
+                try:
+                    row = fitsio.read(fp, ext='INT_TIMES', rows=[0],
+                                      columns=['int_mid_MJD_UTC'])
+                    return float(row[0][0])
+                except Exception:
+                    pass  # fall back to astropy below
+            int_times = fits.getdata(fp, extname='INT_TIMES', memmap=True)
+            return int_times['int_mid_MJD_UTC'][0]
+        elif fp.endswith('.h5'):
+            with h5py.File(fp, 'r') as h:
+                return float(h['time'][0]) if 'time' in h else None
+    except Exception:
+        pass
     return None
 
 
+def sort_files_by_start_time(file_paths):
+    """Return FITS/H5 paths ordered by start time, dropping unreadable files.
+    Header reads are I/O bound (astropy/h5py release the GIL), so they run
+    in a thread pool.
+    """
+    if not file_paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(16, len(file_paths))) as executor:
+        file_times = [
+            (fp, t)
+            for fp, t in zip(file_paths, executor.map(read_start_time, file_paths))
+            if t is not None
+        ]
+    return [fp for fp, _ in sorted(file_times, key=lambda x: x[1])]
+
+
+def _axis_mask(values, value_range, name, label, unit, fmt):
+    """Resolve one user range into a boolean mask over ``values``.
+    Open ends default to the data extent and the range is clamped to it;
+    an empty range falls back to the full axis. Returns (mask, info), where
+    info is the range_info entry or None when nothing was filtered; an
+    unfiltered axis gets ``slice(None)`` so indexing with it is a free view.
+    """
+    if not value_range or (value_range[0] is None and value_range[1] is None):
+        return slice(None), None
+
+    data_min, data_max = values.min(), values.max()
+    lo = value_range[0] if value_range[0] is not None else data_min
+    hi = value_range[1] if value_range[1] is not None else data_max
+    lo = max(lo, data_min)
+    hi = min(hi, data_max)
+    if lo >= hi:
+        logger.warning(f"Invalid {name} range: {lo} to {hi}. Using full range.")
+        return slice(None), None
+    mask = (values >= lo) & (values <= hi)
+    return mask, f"{label}: {lo:{fmt}} - {hi:{fmt}} {unit}"
+
+
+def _range_masks(wavelength, time, wavelength_range=None, time_range=None):
+    """Resolve user ranges into boolean masks over the wavelength and time axes.
+    Returns (wl_mask, time_mask, range_info).
+    """
+    wl_mask, wl_info = _axis_mask(
+        wavelength, wavelength_range, 'wavelength', 'Wavelength', 'um', '.3f',
+    )
+    time_mask, time_info = _axis_mask(
+        time, time_range, 'time', 'Time', 'hours', '.2f',
+    )
+    range_info = [info for info in (wl_info, time_info) if info]
+    return wl_mask, time_mask, range_info
+
+
+def _mask_to_index(mask):
+    """Return a slice equivalent to ``mask`` when its True entries are
+    contiguous (sorted axes), so indexing yields views; else the mask."""
+    if isinstance(mask, slice):
+        return mask
+    idx = np.flatnonzero(mask)
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return slice(idx[0], idx[-1] + 1)
+    return mask
+
+
 def apply_data_ranges(wavelength, flux, time, wavelength_range=None,
                       time_range=None):
     """Filter wavelength and time axes to user-specified ranges.
     Returns (filtered_wavelength, filtered_flux, filtered_time, range_info).
     """
-    range_info = []
-    original_wl_range = (wavelength.min(), wavelength.max())
-    original_time_range = (time.min(), time.max())
-
-    # Wavelength mask
-    if wavelength_range and (wavelength_range[0] is not None
-                             or wavelength_range[1] is not None):
-        wl_min = (wavelength_range[0]
-                  if wavelength_range[0] is not None else original_wl_range[0])
-        wl_max = (wavelength_range[1]
-                  if wavelength_range[1] is not None else original_wl_range[1])
-        wl_min = max(wl_min, original_wl_range[0])
-        wl_max = min(wl_max, original_wl_range[1])
-        if wl_min >= wl_max:
-            logger.warning(
-                f"Invalid wavelength range: {wl_min} to {wl_max}. Using full range."
-            )
-            wl_mask = np.ones(len(wavelength), dtype=bool)
-        else:
-            wl_mask = (wavelength >= wl_min) & (wavelength <= wl_max)
-            range_info.append(f"Wavelength: {wl_min:.3f} - {wl_max:.3f} um")
-    else:
-        wl_mask = np.ones(len(wavelength), dtype=bool)
-
-    # Time mask
-    if time_range and (time_range[0] is not None
-                       or time_range[1] is not None):
-        time_min = (time_range[0]
-                    if time_range[0] is not None else original_time_range[0])
-        time_max = (time_range[1]
-                    if time_range[1] is not None else original_time_range[1])
-        time_min = max(time_min, original_time_range[0])
-        time_max = min(time_max, original_time_range[1])
-        if time_min >= time_max:
-            logger.warning(
-                f"Invalid time range: {time_min} to {time_max}. Using full range."
-            )
-            time_mask = np.ones(len(time), dtype=bool)
-        else:
-            time_mask = (time >= time_min) & (time <= time_max)
-            range_info.append(f"Time: {time_min:.2f} - {time_max:.2f} hours")
-    else:
-        time_mask = np.ones(len(time), dtype=bool)
+    filtered_wavelength, (filtered_flux,), filtered_time, range_info = (
+        apply_data_ranges_multi(
+            wavelength, time, [flux], wavelength_range, time_range,
+        )
+    )
+    return filtered_wavelength, filtered_flux, filtered_time, range_info
+
+
+def apply_data_ranges_multi(wavelength, time, arrays, wavelength_range=None,
+                            time_range=None):
+    """Filter several (wavelength x time) arrays sharing the same axes.
+    The ranges are resolved once and applied to every array.
+    Returns (filtered_wavelength, filtered_arrays, filtered_time, range_info).
+    """
+    wl_mask, time_mask, range_info = _range_masks(
+        wavelength, time, wavelength_range, time_range,
+    )
+    wl_idx = _mask_to_index(wl_mask)
+    time_idx = _mask_to_index(time_mask)
 
-    filtered_wavelength = wavelength[wl_mask]
-    filtered_flux = flux[wl_mask, :][:, time_mask]
-    filtered_time = time[time_mask]
+    filtered_wavelength = wavelength[wl_idx]
+    if isinstance(wl_idx, slice) or isinstance(time_idx, slice):
+        # Mixed basic/advanced indexing: one gather (or a pure view)
+        filtered_arrays = [a[wl_idx, time_idx] for a in arrays]
+    else:
+        # Two masks: gather the cross product in one pass, no intermediate
+        rows_cols = np.ix_(wl_idx, time_idx)
+        filtered_arrays = [a[rows_cols] for a in arrays]
+    filtered_time = time[time_idx]
 
     logger.info(
         f"Wavelength filtering: {len(wavelength)} -> "
@@ -81,46 +259,60 @@ def apply_data_ranges(wavelength, flux, time, wavelength_range=None,
     logger.info(
         f"Time filtering: {len(time)} -> {len(filtered_time)} points"
     )
-    return filtered_wavelength, filtered_flux, filtered_time, range_info
+    return filtered_wavelength, filtered_arrays, filtered_time, range_info
+
+
+def _h5_array(dset, file_path):
+    """Return an HDF5 dataset as an array, memory-mapped when possible.
+
+    Contiguous, uncompressed datasets are mapped straight from the file, so
+    rows are paged in only when used and never copied into process memory;
+    chunked or filtered datasets fall back to a full read.
+    """
+    if dset.chunks is None and dset.compression is None and dset.dtype.kind in 'fiu':
+        offset = dset.id.get_offset()
+        if offset is not None:
+            return np.memmap(file_path, dtype=dset.dtype, mode='r',
+                             offset=offset, shape=dset.shape)
+    return dset[()]
 
 
 def load_integrations_from_h5(file_path, per_integ_cb=None,
                               total_in_file=None):
     """Load spectral integrations from an HDF5 file.
-    Returns (integrations, header_info) or (None, None) on failure.
+    Returns (SpectralBlock, header_info) or (None, None) on failure.
     """
     with h5py.File(file_path, 'r') as f:
-        flux_k = _first_key(f, "calibrated_optspec", "stdspec", "optspec")
-        wave_k = _first_key(f, "eureka_wave_1d", "wave_1d", "wavelength", "wave")
-        time_k = _first_key(f, "time", "bmjd", "mjd", "bjd", "time_bjd", "time_mjd")
-        err_k = _first_key(f, "calibrated_opterr", "stdvar", "error", "flux_error", "sigma")
+        names = set(f.keys())
+        flux_k = _first_key(names, "calibrated_optspec", "stdspec", "optspec")
+        wave_k = _first_key(names, "eureka_wave_1d", "wave_1d", "wavelength", "wave")
+        time_k = _first_key(names, "time", "bmjd", "mjd", "bjd", "time_bjd", "time_mjd")
+        err_k = _first_key(names, "calibrated_opterr", "stdvar", "error", "flux_error", "sigma")
 
         if not (flux_k and wave_k and time_k):
             return None, None
 
-        flux = f[flux_k][:]
+        flux = _h5_array(f[flux_k], file_path)
         wl = f[wave_k][:]
         t = f[time_k][:]
 
         err = None
         if err_k:
-            err_data = f[err_k][:]
+            err_data = _h5_array(f[err_k], file_path)
             if err_k.endswith("stdvar"):
                 err = np.sqrt(err_data)
             else:
                 err = err_data
 
-        integrations = []
+        block = SpectralBlock(
+            wavelength=wl,
+            flux2d=flux,
+            errors2d=err if err is not None else _missing_errors(flux),
+            times=np.asarray(t, dtype=float),
+        )
         nint = flux.shape[0]
-        for i in range(flux.shape[0]):
-            integrations.append({
-                "wavelength": wl,
-                "flux": flux[i, :],
-                "error": (err[i, :] if err is not None
-                          else np.full(flux.shape[1], np.nan)),
-                "time": t[i],
-            })
-            if per_integ_cb:
+        if per_integ_cb:
+            for i in range(nint):
                 per_integ_cb(i + 1, total_in_file or nint)
 
         header_info = {
@@ -133,18 +325,211 @@ def load_integrations_from_h5(file_path, per_integ_cb=None,
             "exposure_time": "Unknown",
             "flux_unit": "Unknown",
         }
-        return integrations, header_info
+        return block, header_info
+
+
+def _table_columns(table):
+    """Return the WAVELENGTH, FLUX and FLUX_ERROR columns of an EXTRACT1D
+    table as whole arrays (FLUX_ERROR is None when absent)."""
+    err = table['FLUX_ERROR'] if 'FLUX_ERROR' in table.columns.names else None
+    return table['WAVELENGTH'], table['FLUX'], err
+
+
+def _integrations_from_columns(wl_col, flux_col, err_col, mjds, per_integ_cb=None,
+                               total=None, tag=''):
+    """Build a SpectralBlock from whole EXTRACT1D columns (one row each).
+
+    Finite-value masks and counts are computed for all rows at once; only
+    rows with at least 10 valid points are kept. Returns None if none are.
+    """
+    n = len(mjds)
+    total = total or n
+    flux2d = np.asarray(flux_col[:n])
+    ragged = flux2d.dtype == object
+    if ragged:
+        # Variable-length array columns: rows differ in length
+        wl_rows = wl_col[:n]
+        masks = [np.isfinite(f) & np.isfinite(w) for w, f in zip(wl_rows, flux2d)]
+        counts = np.array([m.sum() for m in masks])
+        lengths = [len(f) for f in flux2d]
+    else:
+        wl2d = np.asarray(wl_col[:n])
+        masks = np.isfinite(flux2d)
+        masks &= np.isfinite(wl2d)  # in place: no third (n, nwave) temporary
+        counts = masks.sum(axis=1)
+        lengths = [flux2d.shape[1]] * n
+
+    for idx in range(min(3, n)):
+        logger.info(
+            f"   Integration {idx + 1}{tag}: {counts[idx]}/{lengths[idx]} "
+            f"valid points, time={mjds[idx]:.6f}"
+        )
+    for idx in np.flatnonzero(counts < 10):
+        logger.warning(
+            f"   Skipping integration {idx + 1}: only {counts[idx]} valid points"
+        )
+
+    keep = np.flatnonzero(counts >= 10)
+    if per_integ_cb:
+        for idx in keep:
+            per_integ_cb(idx + 1, total)
+    if len(keep) == 0:
+        return None
+    times = np.asarray(mjds, dtype=float)[keep]
+
+    if ragged:
+        flux_rows = [flux2d[i] for i in keep]
+        return _block_from_rows(
+            [wl_rows[i] for i in keep],
+            flux_rows,
+            ([err_col[i] for i in keep] if err_col is not None
+             else [None] * len(keep)),
+            [masks[i] for i in keep],
+            times,
+        )
+
+    # Fancy indexing copies the kept rows out of the memory-mapped table
+    flux_kept = flux2d[keep]
+    return SpectralBlock(
+        wavelength=wl2d[keep] if wl2d.ndim == 2 else wl2d,
+        flux2d=flux_kept,
+        errors2d=(np.asarray(err_col[:n])[keep] if err_col is not None
+                  else _missing_errors(flux_kept)),
+        times=times,
+        valid=masks[keep],
+    )
+
+
+def _table_time_column(extract_table):
+    """Name of the MJD column embedded in an EXTRACT1D table, or None."""
+    colnames = set(extract_table.columns.names)
+    return next(
+        (col for col in ('MJD-AVG', 'MJD-BEG', 'MJD-END') if col in colnames),
+        None,
+    )
+
+
+def _fits_layout(hdul, extract_table):
+    """Name the EXTRACT1D layout variant of an open _x1dints file."""
+    if len(extract_table) > 0 and _table_time_column(extract_table):
+        return 'embedded_time'
+    try:
+        hdul['EXTRACT1D', 1].data
+    except (KeyError, IndexError, TypeError):
+        logger.info(f"   EXTRACT1D format: single table")
+        return 'single_table'
+    logger.info(f"   EXTRACT1D format: individual extensions")
+    return 'individual_extensions'
+
+
+def _load_fits_table_with_embedded_time(hdul, extract_table, mids, per_integ_cb):
+    """Layout 1: one table row per integration, with its own MJD column."""
+    logger.info(f"   EXTRACT1D format: table with embedded time columns")
+    logger.info(f"   Processing {len(extract_table)} integrations from table...")
+    time_col = _table_time_column(extract_table)
+    logger.info(f"   Using time column: {time_col}")
+
+    # Column slabs: one read per column instead of per-row records
+    wl_col, flux_col, err_col = _table_columns(extract_table)
+    return _integrations_from_columns(
+        wl_col, flux_col, err_col, np.asarray(extract_table[time_col]),
+        per_integ_cb, len(extract_table),
+    )
+
+
+def _load_fits_individual_extensions(hdul, extract_table, mids, per_integ_cb):
+    """Layout 2: one EXTRACT1D extension per integration (EXTVER 1..nint)."""
+    nint = len(mids)
+    logger.info(f"   Processing {nint} individual EXTRACT1D extensions...")
+    # Index the extensions in one pass; hdul['EXTRACT1D', idx]
+    # rescans the HDU list on every lookup.
+    extensions = {}
+    for hdu in hdul:
+        if hdu.name == 'EXTRACT1D':
+            extensions.setdefault(hdu.ver, hdu)
+
+    wl_rows, flux_rows, err_rows, valid_rows, times = [], [], [], [], []
+    for idx, mjd in enumerate(mids, start=1):
+        try:
+            if idx not in extensions:
+                raise KeyError(f"Extension {('EXTRACT1D', idx)!r} not found.")
+            data = extensions[idx].data
+            w = data['WAVELENGTH']
+            f = data['FLUX']
+            e = data['FLUX_ERROR'] if 'FLUX_ERROR' in data.names else None
+
+            mask = np.isfinite(f) & np.isfinite(w)
+            n_valid = np.sum(mask)
+
+            if idx <= 3:
+                logger.info(
+                    f"   Integration {idx} (individual): "
+                    f"{n_valid}/{len(f)} valid points"
+                )
+
+            if n_valid < 10:
+                logger.warning(
+                    f"   Skipping integration {idx}: only {n_valid} valid points"
+                )
+                continue
+
+            # Flattened, as boolean indexing of the row did
+            wl_rows.append(np.ravel(w))
+            flux_rows.append(np.ravel(f))
+            err_rows.append(None if e is None else np.ravel(e))
+            valid_rows.append(np.ravel(mask))
+            times.append(float(mjd))
+            if per_integ_cb:
+                per_integ_cb(idx, nint)
+
+        except (KeyError, IndexError) as e:
+            logger.error(
+                f"   ERROR processing integration {idx}: {e}", exc_info=True,
+            )
+            continue
+
+    if not times:
+        return None
+    # Packing copies the rows out of the memory-mapped HDUs
+    return _block_from_rows(wl_rows, flux_rows, err_rows, valid_rows, times)
+
+
+def _load_fits_single_table(hdul, extract_table, mids, per_integ_cb):
+    """Layout 3: one table row per integration, times from INT_TIMES."""
+    nint = len(mids)
+    logger.info(
+        f"   Processing {nint} integrations from table "
+        f"(using INT_TIMES for time)..."
+    )
+    if nint > len(extract_table):
+        logger.warning(
+            f"   Skipping integrations {len(extract_table) + 1}-{nint}: "
+            f"table only has {len(extract_table)} rows"
+        )
+    wl_col, flux_col, err_col = _table_columns(extract_table)
+    return _integrations_from_columns(
+        wl_col, flux_col, err_col, mids[:len(extract_table)],
+        per_integ_cb, nint, tag=' (fallback)',
+    )
+
+
+_FITS_LOADERS = {
+    'embedded_time': _load_fits_table_with_embedded_time,
+    'individual_extensions': _load_fits_individual_extensions,
+    'single_table': _load_fits_single_table,
+}
 
 
 def load_integrations_from_fits(file_path, per_integ_cb=None,
                                 total_in_file=None):
     """Load spectral integrations from a JWST _x1dints.fits file.
-    Handles three FITS layout variants. Returns (integrations, header_info)
-    or (None, None) on failure.
+    The EXTRACT1D layout is detected once and handed to the matching
+    _load_fits_* loader. Returns (SpectralBlock, header_info) or
+    (None, None) on failure.
     """
     try:
         logger.info(f"Opening FITS file: {os.path.basename(file_path)}")
-        with fits.open(file_path) as hdul:
+        with fits.open(file_path, memmap=True) as hdul:
             logger.info(f"   Available extensions: {[hdu.name for hdu in hdul]}")
 
             if 'INT_TIMES' not in hdul:
@@ -157,6 +542,8 @@ def load_integrations_from_fits(file_path, per_integ_cb=None,
             if 'EXTRACT1D' not in hdul:
                 logger.error(f"   No EXTRACT1D extension found")
                 return None, None
+            extract_hdu = hdul['EXTRACT1D']
+            extract_header = extract_hdu.header
 
             header_info = {
                 'filename': os.path.basename(file_path),
@@ -169,213 +556,38 @@ def load_integrations_from_fits(file_path, per_integ_cb=None,
             }
 
             flux_unit = hdul[0].header.get('BUNIT', None)
-            if flux_unit is None and 'EXTRACT1D' in hdul:
-                flux_unit = hdul['EXTRACT1D'].header.get('BUNIT', None)
             if flux_unit is None:
-                for i in range(1, 10):
-                    unit = hdul['EXTRACT1D'].header.get(f'TUNIT{i}', None)
-                    if (unit and 'flux' in
-                            hdul['EXTRACT1D'].header.get(f'TTYPE{i}', '').lower()):
+                flux_unit = extract_header.get('BUNIT', None)
+            if flux_unit is None:
+                # First of columns 1-9 with a unit and "flux" in its name
+                columns = {}
+                for card in extract_header.cards:
+                    kw = card.keyword
+                    if kw.startswith(('TTYPE', 'TUNIT')) and kw[5:].isdigit():
+                        columns.setdefault(int(kw[5:]), {})[kw[:5]] = card.value
+                for i in sorted(c for c in columns if c < 10):
+                    unit = columns[i].get('TUNIT')
+                    if unit and 'flux' in columns[i].get('TTYPE', '').lower():
                         flux_unit = unit
                         break
             if flux_unit is None:
                 flux_unit = 'MJy'
             header_info['flux_unit'] = flux_unit
 
-            integrations = []
-            nint = len(mids)
-
-            # Detect which FITS layout variant we have
-            extract_table = hdul['EXTRACT1D'].data
-            has_table_format = len(extract_table) > 0
-            has_time_in_table = any(
-                col in extract_table.columns.names
-                for col in ['MJD-AVG', 'MJD-BEG', 'MJD-END']
-            )
-
-            # Branch 1: Table with embedded MJD time columns
-            if has_table_format and has_time_in_table:
-                logger.info(
-                    f"   EXTRACT1D format: table with embedded time columns"
-                )
-                logger.info(
-                    f"   Processing {len(extract_table)} integrations from table..."
-                )
-
-                time_col = None
-                if 'MJD-AVG' in extract_table.columns.names:
-                    time_col = 'MJD-AVG'
-                elif 'MJD-BEG' in extract_table.columns.names:
-                    time_col = 'MJD-BEG'
-                elif 'MJD-END' in extract_table.columns.names:
-                    time_col = 'MJD-END'
-
-                logger.info(f"   Using time column: {time_col}")
-
-                for idx in range(len(extract_table)):
-                    try:
-                        row = extract_table[idx]
-                        w = row['WAVELENGTH']
-                        f = row['FLUX']
-                        e = (row['FLUX_ERROR']
-                             if 'FLUX_ERROR' in extract_table.columns.names
-                             else np.full_like(f, np.nan))
-                        mjd = row[time_col]
-
-                        mask = np.isfinite(f) & np.isfinite(w)
-                        n_valid = np.sum(mask)
-
-                        if idx < 3:
-                            logger.info(
-                                f"   Integration {idx + 1}: {n_valid}/{len(f)} "
-                                f"valid flux points, time={mjd:.6f}"
-                            )
-
-                        if n_valid < 10:
-                            logger.warning(
-                                f"   Skipping integration {idx + 1}: "
-                                f"only {n_valid} valid points"
-                            )
-                            continue
-
-                        integrations.append({
-                            'wavelength': w[mask],
-                            'flux': f[mask],
-                            'error': e[mask],
-                            'time': Time(mjd, format='mjd', scale='utc'),
-                        })
-
-                        if per_integ_cb:
-                            per_integ_cb(idx + 1, len(extract_table))
-
-                    except Exception as e:
-                        logger.error(
-                            f"   ERROR processing integration {idx + 1}: {e}",
-                            exc_info=True,
-                        )
-                        continue
-
-            else:
-                # Check for individual EXTRACT1D extensions
-                has_individual_extensions = False
-                try:
-                    test_data = hdul['EXTRACT1D', 1].data
-                    has_individual_extensions = True
-                    logger.info(f"   EXTRACT1D format: individual extensions")
-                except (KeyError, IndexError, TypeError):
-                    logger.info(f"   EXTRACT1D format: single table")
-
-                # Branch 2: Individual EXTRACT1D extensions (1-indexed)
-                if has_individual_extensions:
-                    logger.info(
-                        f"   Processing {nint} individual EXTRACT1D extensions..."
-                    )
-                    for idx, mjd in enumerate(mids, start=1):
-                        try:
-                            data = hdul['EXTRACT1D', idx].data
-                            w = data['WAVELENGTH']
-                            f = data['FLUX']
-                            e = (data['FLUX_ERROR']
-                                 if 'FLUX_ERROR' in data.names
-                                 else np.full_like(f, np.nan))
-
-                            mask = np.isfinite(f) & np.isfinite(w)
-                            n_valid = np.sum(mask)
-
-                            if idx <= 3:
-                                logger.info(
-                                    f"   Integration {idx} (individual): "
-                                    f"{n_valid}/{len(f)} valid points"
-                                )
-
-                            if n_valid < 10:
-                                logger.warning(
-                                    f"   Skipping integration {idx}: "
-                                    f"only {n_valid} valid points"
-                                )
-                                continue
-
-                            integrations.append({
-                                'wavelength': w[mask],
-                                'flux': f[mask],
-                                'error': e[mask],
-                                'time': Time(mjd, format='mjd', scale='utc'),
-                            })
-                            if per_integ_cb:
-                                per_integ_cb(idx, nint)
-
-                        except (KeyError, IndexError) as e:
-                            logger.error(
-                                f"   ERROR processing integration {idx}: {e}",
-                                exc_info=True,
-                            )
-                            continue
-
-                # Branch 3: Single table, times from INT_TIMES
-                else:
-                    logger.info(
-                        f"   Processing {nint} integrations from table "
-                        f"(using INT_TIMES for time)..."
-                    )
-
-                    for idx, mjd in enumerate(mids):
-                        if idx >= len(extract_table):
-                            logger.warning(
-                                f"   Skipping integration {idx + 1}: "
-                                f"table only has {len(extract_table)} rows"
-                            )
-                            continue
-
-                        try:
-                            row = extract_table[idx]
-                            w = row['WAVELENGTH']
-                            f = row['FLUX']
-                            e = (row['FLUX_ERROR']
-                                 if 'FLUX_ERROR' in extract_table.columns.names
-                                 else np.full_like(f, np.nan))
-
-                            mask = np.isfinite(f) & np.isfinite(w)
-                            n_valid = np.sum(mask)
-
-                            if idx < 3:
-                                logger.info(
-                                    f"   Integration {idx + 1} (fallback): "
-                                    f"{n_valid}/{len(f)} valid points"
-                                )
-
-                            if n_valid < 10:
-                                logger.warning(
-                                    f"   Skipping integration {idx + 1}: "
-                                    f"only {n_valid} valid points"
-                                )
-                                continue
-
-                            integrations.append({
-                                'wavelength': w[mask],
-                                'flux': f[mask],
-                                'error': e[mask],
-                                'time': Time(mjd, format='mjd', scale='utc'),
-                            })
-                            if per_integ_cb:
-                                per_integ_cb(idx + 1, nint)
-
-                        except Exception as e:
-                            logger.error(
-                                f"   ERROR processing integration {idx + 1}: {e}",
-                                exc_info=True,
-                            )
-                            continue
+            extract_table = extract_hdu.data
+            layout = _fits_layout(hdul, extract_table)
+            block = _FITS_LOADERS[layout](hdul, extract_table, mids, per_integ_cb)
 
             logger.info(
-                f"   Loaded {len(integrations)} integrations "
+                f"   Loaded {len(block) if block else 0} integrations "
                 f"from {len(mids)} INT_TIMES entries"
             )
 
-            if len(integrations) == 0:
+            if not block:
                 logger.error(f"   No integrations were successfully loaded!")
                 return None, None
 
-            return integrations, header_info
+            return block, header_info
 
     except Exception as e:
         logger.error(
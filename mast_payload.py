@@ -0,0 +1,143 @@
+"""
+Payload builders for ``/upload_mast`` and the ``/start_mast`` background job.
+
+``/upload_mast`` runs in ``ProcessPoolExecutor`` workers, which import this
+module to unpickle the task, so it depends only on the pipeline modules and
+never on ``state`` or ``routes`` (importing those would start a second
+dataset cache in every worker).
+"""
+
+import logging
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from data_io import apply_data_ranges_multi
+from processing import process_mast_files_with_gaps, _row_nanmedian
+from plotting import create_surface_plot_with_visits, create_heatmap_plot, figure_json
+
+logger = logging.getLogger(__name__)
+
+
+def build_mast_payload(fits_files_sorted, form_args):
+    """Run the pipeline and build the ``/upload_mast`` response payload.
+
+    Pure function of its arguments (no Flask or ``state`` access) so it can
+    run in a worker process.
+    """
+    # Run processing pipeline
+    wavelength_1d, flux_norm_2d, flux_raw_2d, time_1d, metadata, error_raw_2d = (
+        process_mast_files_with_gaps(
+            fits_files_sorted,
+            form_args['use_interpolation'],
+            wavelength_range=form_args['wavelength_range'],
+        )
+    )
+    return build_plot_payload(wavelength_1d, flux_norm_2d, flux_raw_2d, time_1d,
+                              metadata, error_raw_2d, form_args)
+
+
+def build_plot_payload(wavelength_1d, flux_norm_2d, flux_raw_2d, time_1d, metadata,
+                       error_raw_2d, form_args, progress_cb=None, include_raw=False):
+    """Apply the user's ranges to processed data and build the plot payload.
+
+    Shared by ``/upload_mast`` and the ``/start_mast`` background job.
+    ``progress_cb(percent, message)`` is called before filtering and before
+    rendering; ``include_raw`` adds the filtered raw arrays for client-side
+    re-plotting. ``metadata`` gains a ``user_ranges`` entry.
+    """
+    custom_bands = form_args['custom_bands']
+    colorscale = form_args['colorscale']
+    z_axis_display = form_args['z_axis_display']
+    time_range = form_args['time_range']
+    wavelength_range = form_args['wavelength_range']
+    variability_range = form_args['variability_range']
+
+    if progress_cb:
+        progress_cb(95.0, "Applying filters…")
+
+    # Apply user-specified data ranges
+    range_info = []
+    if wavelength_range or time_range:
+        (wavelength_1d_filtered,
+         (flux_norm_2d_filtered, flux_raw_2d_filtered, error_raw_2d_filtered),
+         time_1d_filtered, range_info) = apply_data_ranges_multi(
+            wavelength_1d, time_1d,
+            [flux_norm_2d, flux_raw_2d, error_raw_2d],
+            wavelength_range, time_range,
+        )
+        logger.info(f"   Ranges applied: {'; '.join(range_info)}")
+    else:
+        wavelength_1d_filtered, time_1d_filtered = wavelength_1d, time_1d
+        flux_norm_2d_filtered = flux_norm_2d
+        flux_raw_2d_filtered = flux_raw_2d
+        error_raw_2d_filtered = error_raw_2d
+
+    metadata['user_ranges'] = '; '.join(range_info) if range_info else None
+
+    # Per-wavelength median of the raw flux: the reference spectrum, and
+    # the scale for converting errors to variability percent
+    median_per_wl = _row_nanmedian(flux_raw_2d_filtered)
+    ref_spec = median_per_wl[:, 0]
+
+    # Choose Z data and error data based on display mode
+    if z_axis_display == 'flux':
+        z_data = flux_raw_2d_filtered
+        errors_for_plot = error_raw_2d_filtered
+    else:
+        z_data = flux_norm_2d_filtered
+        # Convert errors to variability percentage
+        median_scale = np.where(median_per_wl == 0, 1.0, median_per_wl)
+        errors_for_plot = (error_raw_2d_filtered / median_scale) * 100
+
+    if progress_cb:
+        progress_cb(96.0, "Rendering plots…")
+
+    # Create plots
+    surface_plot = create_surface_plot_with_visits(
+        z_data,
+        wavelength_1d_filtered,
+        time_1d_filtered,
+        '3D Surface Plot',
+        num_plots=1000,
+        smooth_sigma=2,
+        wavelength_unit='um',
+        custom_bands=custom_bands,
+        colorscale=colorscale,
+        z_range=variability_range,
+        z_axis_display=z_axis_display,
+        flux_unit=metadata.get('flux_unit', 'Unknown'),
+        errors_2d=errors_for_plot,
+    )
+    heatmap_plot = create_heatmap_plot(
+        z_data,
+        wavelength_1d_filtered,
+        time_1d_filtered,
+        'Heatmap',
+        num_plots=1000,
+        smooth_sigma=2,
+        wavelength_unit='um',
+        custom_bands=custom_bands,
+        colorscale=colorscale,
+        z_range=variability_range,
+        z_axis_display=z_axis_display,
+        flux_unit=metadata.get('flux_unit', 'Unknown'),
+        errors_2d=error_raw_2d_filtered,
+    )
+
+    # Encoded once with orjson (a hard dependency, so named rather than
+    # left to 'auto'), reused for the response and /download_plots
+    payload = {
+        'surface_plot': figure_json(surface_plot),
+        'heatmap_plot': figure_json(heatmap_plot),
+        'metadata': metadata,
+        'reference_spectrum': to_json_plotly(ref_spec, engine='orjson'),
+    }
+    if include_raw:
+        payload.update({
+            'raw_flux_2d': to_json_plotly(np.asarray(flux_raw_2d_filtered), engine='orjson'),
+            'raw_error_2d': to_json_plotly(np.asarray(error_raw_2d_filtered), engine='orjson'),
+            'raw_wavelengths': to_json_plotly(np.asarray(wavelength_1d_filtered), engine='orjson'),
+            'raw_time': to_json_plotly(np.asarray(time_1d_filtered), engine='orjson'),
+        })
+    return payload
@@ -6,11 +6,120 @@ import logging
 
 import numpy as np
 import plotly.graph_objs as go
+import plotly.io as pio
 
-from processing import process_data, identify_visits
+from processing import (
+    process_data, identify_visits, _block_mean,
+)
 
 logger = logging.getLogger(__name__)
 
+# Plots are viewed at a few hundred pixels per axis; finer grids only add
+# JSON payload and browser rasterization work.
+MAX_PLOT_ROWS = 512     # wavelength samples
+MAX_PLOT_COLS = 1024    # time samples
+EXTREMA_BLOCK = 1 << 16  # elements per min/max block (fits in L2)
+
+# Validated once at import (go.Layout walks the whole plotly_dark template);
+# each plot adds its varying keys to a shallow copy, in validated form.
+_LAYOUT_BASE = go.Layout(
+    template='plotly_dark',
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#ffffff'),
+    hovermode='closest',
+    showlegend=False,
+).to_plotly_json()
+
+_HOVER_TEMPLATE = (
+    'Time: %{{x:.2f}}<br>{wl}: %{{y:.4f}}<br>'
+    '{label}: %{{z:{fmt}}}{suffix}<extra></extra>'
+)
+
+
+def figure_json(fig):
+    """Encode a figure dict from this module as Plotly JSON.
+
+    Traces and layout are assembled here in validated form, so the figure
+    is not re-validated (that would copy every array and walk the whole
+    template again).
+    """
+    return pio.to_json(fig, validate=False, engine='orjson')
+
+
+def _colorscale_spec(colorscale):
+    """Expand a colorscale name into explicit stops.
+
+    Traces are built as plain dicts (no validation), and plotly.js only knows
+    a subset of the names in ``COLOR_SCALES``.
+    """
+    return go.Heatmap(colorscale=colorscale).to_plotly_json()['colorscale']
+
+
+def _nan_extrema(a):
+    """Return ``(min, max)`` of ``a`` ignoring NaNs, in one pass over memory.
+
+    ``fmin``/``fmax`` skip NaNs natively, and both reductions run on each
+    cache-sized block before moving on, so ``a`` is streamed only once.
+    """
+    flat = np.ravel(a)
+    lo = hi = np.nan
+    for i in range(0, flat.size, EXTREMA_BLOCK):
+        block = flat[i:i + EXTREMA_BLOCK]
+        lo = np.fmin(lo, np.fmin.reduce(block))
+        hi = np.fmax(hi, np.fmax.reduce(block))
+    return lo, hi
+
+
+def _resolve_zrange(Z, z_range, z_axis_display, extrema, in_place=False):
+    """Apply the user's colour range to ``Z``.
+
+    Returns ``(Z_clipped, z_min, z_max)``. Open ends fall back to
+    ``extrema``, the NaN-aware data extent; in variability mode a missing
+    lower bound mirrors the upper one and a scalar range means +/- that
+    value. With ``in_place`` the clip is written back into ``Z`` rather
+    than a new array.
+    """
+    data_min, data_max = extrema
+    if isinstance(z_range, (tuple, list)):
+        if z_axis_display == 'variability':
+            z_min = -z_range[1] if z_range[0] is None else z_range[0]
+            z_max = z_range[1] if z_range[1] is not None else data_max
+        else:
+            z_min = z_range[0] if z_range[0] is not None else data_min
+            z_max = z_range[1] if z_range[1] is not None else data_max
+    elif isinstance(z_range, (int, float)):
+        if z_axis_display == 'variability':
+            z_min, z_max = -z_range, z_range
+        else:
+            z_min, z_max = data_min, data_max
+    else:
+        return Z, data_min, data_max
+    if data_min >= z_min and data_max <= z_max:
+        return Z, z_min, z_max  # already inside the range; nothing to clip
+    return np.clip(Z, z_min, z_max, out=Z if in_place else None), z_min, z_max
+
+
+def _plot_array(a):
+    """Contiguous float32 copy of ``a`` for a trace (None passes through).
+
+    The browser renders and hovers at well under float32 precision, and
+    the JSON encoder writes float32 with about half as many digits.
+    """
+    if a is None:
+        return None
+    return np.ascontiguousarray(a, dtype=np.float32)
+
+
+def _downsample_factors(shape, max_y=MAX_PLOT_ROWS, max_x=MAX_PLOT_COLS):
+    """Return (row, column) block sizes that bring ``shape`` within limits."""
+    return max(1, -(-shape[0] // max_y)), max(1, -(-shape[1] // max_x))
+
+
+def _downsample_2d(Z, sy, sx):
+    """Block-mean a 2-D array by ``sy`` rows and ``sx`` columns."""
+    return _block_mean(_block_mean(Z, sy, 0), sx, 1)
+
 
 def create_surface_plot_with_visits(flux, wavelength, time, title, num_plots,
                                     smooth_sigma=2, wavelength_unit='um',
@@ -18,17 +127,23 @@ def create_surface_plot_with_visits(flux, wavelength, time, title, num_plots,
                                     gap_threshold=0.5, use_interpolation=False,
                                     z_range=None, z_axis_display='variability',
                                     flux_unit='Unknown', errors_2d=None):
-    """Create an interactive 3-D Plotly surface plot, one trace per visit."""
-    x, y, X, Y, Z, wavelength_label = process_data(
+    """Create an interactive 3-D Plotly surface plot, one trace per visit.
+
+    Returns the figure as a plain dict; encode it with ``figure_json``.
+    """
+    # errors_2d comes back masked, sorted and binned exactly like Z
+    x, y, X, Y, Z, wavelength_label, errors_2d = process_data(
         flux, wavelength, time, num_plots, False,
         smooth_sigma, wavelength_unit, z_axis_display,
+        target_n_wl=MAX_PLOT_ROWS, errors=errors_2d,
     )
 
+    extrema = _nan_extrema(Z)
     if z_axis_display == 'flux':
         Z_adjusted = Z
         colorbar_title = f'Flux ({flux_unit})'
         hover_z_label = 'Flux'
-        flux_max = np.nanmax(np.abs(Z_adjusted))
+        flux_max = max(abs(extrema[0]), abs(extrema[1]))
         if flux_max < 0.01 or flux_max > 1000:
             hover_z_format = '.2e'
             colorbar_tickformat = '.2e'
@@ -44,31 +159,11 @@ def create_surface_plot_with_visits(flux, wavelength, time, title, num_plots,
         hover_z_suffix = ' %'
         colorbar_tickformat = None
 
-    # Z-range clipping
-    if isinstance(z_range, (tuple, list)):
-        if z_axis_display == 'variability':
-            z_min_range = -z_range[1] if z_range[0] is None else z_range[0]
-            z_max_range = z_range[1] if z_range[1] is not None else Z_adjusted.max()
-        else:
-            z_min_range = z_range[0] if z_range[0] is not None else Z_adjusted.min()
-            z_max_range = z_range[1] if z_range[1] is not None else Z_adjusted.max()
-        Z_clipped = np.clip(Z_adjusted, z_min_range, z_max_range)
-        z_min = z_min_range
-        z_max = z_max_range
-    elif isinstance(z_range, (int, float)):
-        if z_axis_display == 'variability':
-            z_min_range = -z_range
-            z_max_range = z_range
-        else:
-            z_min_range = Z_adjusted.min()
-            z_max_range = Z_adjusted.max()
-        Z_clipped = np.clip(Z_adjusted, z_min_range, z_max_range)
-        z_min = z_min_range
-        z_max = z_max_range
-    else:
-        Z_clipped = Z_adjusted
-        z_min = Z_adjusted.min()
-        z_max = Z_adjusted.max()
+    # Z-range clipping; Z is ours to overwrite unless it aliases the input
+    Z_clipped, z_min, z_max = _resolve_zrange(
+        Z_adjusted, z_range, z_axis_display, extrema,
+        in_place=not np.may_share_memory(Z_adjusted, flux),
+    )
 
     # One surface trace per visit
     if use_interpolation:
@@ -76,14 +171,46 @@ def create_surface_plot_with_visits(flux, wavelength, time, title, num_plots,
     else:
         visits = identify_visits(x, gap_threshold)
 
+    # Downsample wavelength once; time is downsampled per visit so that
+    # blocks never straddle a gap.
+    sy, sx = _downsample_factors(Z_clipped.shape)
+    y_plot = _block_mean(y, sy, 0)
+    Z_rows = _block_mean(Z_clipped, sy, 0)
+    err_rows = _block_mean(errors_2d, sy, 0)
+    if sy > 1 or sx > 1:
+        logger.info(f"Downsampling surface by {sy}x{sx} (wavelength x time)")
+
+    colorscale = _colorscale_spec(colorscale)
+    hovertemplate = _HOVER_TEMPLATE.format(
+        wl=wavelength_label, label=hover_z_label,
+        fmt=hover_z_format, suffix=hover_z_suffix,
+    )
+    colorbar = dict(
+        title=dict(text=colorbar_title, font=dict(color='#ffffff')),
+        tickfont=dict(color='#ffffff'),
+        thickness=15,
+        len=0.8,
+        lenmode='fraction',
+        x=1.02,
+        y=0.5,
+    )
     data = []
     for visit_idx, (start, end) in enumerate(visits):
-        X_visit = X[:, start:end]
-        Y_visit = Y[:, start:end]
-        Z_visit = Z_clipped[:, start:end]
-        cd = errors_2d[:, start:end] if errors_2d is not None else None
+        if sy > 1 or sx > 1:
+            X_visit, Y_visit = np.meshgrid(_block_mean(x[start:end], sx, 0), y_plot)
+            Z_visit = _block_mean(Z_rows[:, start:end], sx, 1)
+            cd = (_block_mean(err_rows[:, start:end], sx, 1)
+                  if errors_2d is not None else None)
+        else:
+            X_visit = X[:, start:end]
+            Y_visit = Y[:, start:end]
+            Z_visit = Z_clipped[:, start:end]
+            cd = errors_2d[:, start:end] if errors_2d is not None else None
+        X_visit, Y_visit, Z_visit, cd = map(_plot_array, (X_visit, Y_visit, Z_visit, cd))
 
-        surface = go.Surface(
+        # Plain trace dicts: go.Surface() would validate (and copy) every array
+        surface = dict(
+            type='surface',
             x=X_visit,
             y=Y_visit,
             z=Z_visit,
@@ -92,53 +219,35 @@ def create_surface_plot_with_visits(flux, wavelength, time, title, num_plots,
             cmin=z_min,
             cmax=z_max,
             showscale=(visit_idx == 0),
-            colorbar=dict(
-                title=colorbar_title,
-                titlefont=dict(color='#ffffff'),
-                tickfont=dict(color='#ffffff'),
-                thickness=15,
-                len=0.8,
-                lenmode='fraction',
-                x=1.02,
-                y=0.5,
-            ),
-            hovertemplate=(
-                'Time: %{x:.2f}<br>'
-                + wavelength_label + ': %{y:.4f}<br>'
-                + hover_z_label + ': %{z:' + hover_z_format + '}'
-                + hover_z_suffix + '<extra></extra>'
-            ),
+            hovertemplate=hovertemplate,
             opacity=1.0,
-            customdata=cd,
         )
+        if visit_idx == 0:
+            # Only the first trace shows a scale; the rest would ship dead JSON
+            surface['colorbar'] = colorbar
+        if cd is not None:
+            surface['customdata'] = cd
         data.append(surface)
 
-    title_text = title
-    layout = go.Layout(
-        template='plotly_dark',
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#ffffff'),
-        title=dict(text=title_text, x=0.5),
-        scene=dict(
-            xaxis=dict(title='Time (hours)', backgroundcolor='rgba(0,0,0,0)',
-                       gridcolor='#555555', zeroline=False, showspikes=False),
-            yaxis=dict(title=wavelength_label, backgroundcolor='rgba(0,0,0,0)',
-                       gridcolor='#555555', zeroline=False, showspikes=False),
+    scene_axis = dict(backgroundcolor='rgba(0,0,0,0)', gridcolor='#555555',
+                      zeroline=False, showspikes=False)
+    layout = {
+        **_LAYOUT_BASE,
+        'title': dict(text=title, x=0.5),
+        'scene': dict(
+            xaxis=dict(title=dict(text='Time (hours)'), **scene_axis),
+            yaxis=dict(title=dict(text=wavelength_label), **scene_axis),
             zaxis=dict(
-                title='Raw Flux' if z_axis_display == 'flux' else 'Variability (%)',
-                backgroundcolor='rgba(0,0,0,0)',
-                gridcolor='#555555', zeroline=False, showspikes=False,
+                title=dict(text='Raw Flux' if z_axis_display == 'flux'
+                           else 'Variability (%)'),
+                **scene_axis,
             ),
             aspectmode='cube',
         ),
-        margin=dict(l=20, r=20, b=20, t=60),
-        autosize=True,
-        hovermode='closest',
-        showlegend=False,
-    )
-    fig = go.Figure(data=data, layout=layout)
-    return fig
+        'margin': dict(l=20, r=20, b=20, t=60),
+        'autosize': True,
+    }
+    return {'data': data, 'layout': layout}
 
 
 def create_heatmap_plot(flux, wavelength, time, title, num_plots,
@@ -146,10 +255,15 @@ def create_heatmap_plot(flux, wavelength, time, title, num_plots,
                         custom_bands=None, colorscale='Viridis',
                         z_range=None, z_axis_display='variability',
                         flux_unit='Unknown', errors_2d=None):
-    """Create an interactive 2-D Plotly heatmap."""
-    x, y, X, Y, Z, wavelength_label = process_data(
+    """Create an interactive 2-D Plotly heatmap.
+
+    Returns the figure as a plain dict; encode it with ``figure_json``.
+    """
+    # errors_2d comes back masked, sorted and binned exactly like Z
+    x, y, X, Y, Z, wavelength_label, errors_2d = process_data(
         flux, wavelength, time, num_plots, False,
         smooth_sigma, wavelength_unit, z_axis_display,
+        target_n_wl=MAX_PLOT_ROWS, errors=errors_2d,
     )
 
     if Z.shape != (len(y), len(x)):
@@ -158,11 +272,12 @@ def create_heatmap_plot(flux, wavelength, time, title, num_plots,
             f"(len(y), len(x)) = {(len(y), len(x))}"
         )
 
+    extrema = _nan_extrema(Z)
     if z_axis_display == 'flux':
         Z_adjusted = Z
         colorbar_title = f'Flux ({flux_unit})'
         hover_z_label = 'Flux'
-        flux_max = np.nanmax(np.abs(Z_adjusted))
+        flux_max = max(abs(extrema[0]), abs(extrema[1]))
         if (flux_max < 0.01) or (flux_max > 1000):
             hover_z_format = '.2e'
             colorbar_tickformat = '.2e'
@@ -178,74 +293,58 @@ def create_heatmap_plot(flux, wavelength, time, title, num_plots,
         hover_z_suffix = ' %'
         colorbar_tickformat = None
 
-    if isinstance(z_range, (tuple, list)):
-        if z_axis_display == 'variability':
-            z_min_range = -z_range[1] if z_range[0] is None else z_range[0]
-            z_max_range = z_range[1] if z_range[1] is not None else np.nanmax(Z_adjusted)
-        else:
-            z_min_range = z_range[0] if z_range[0] is not None else np.nanmin(Z_adjusted)
-            z_max_range = z_range[1] if z_range[1] is not None else np.nanmax(Z_adjusted)
-        Z_clipped = np.clip(Z_adjusted, z_min_range, z_max_range)
-        z_min = z_min_range
-        z_max = z_max_range
-    elif isinstance(z_range, (int, float)):
-        if z_axis_display == 'variability':
-            z_min_range = -z_range
-            z_max_range = z_range
-        else:
-            z_min_range = np.nanmin(Z_adjusted)
-            z_max_range = np.nanmax(Z_adjusted)
-        Z_clipped = np.clip(Z_adjusted, z_min_range, z_max_range)
-        z_min = z_min_range
-        z_max = z_max_range
-    else:
-        Z_clipped = Z_adjusted
-        z_min = np.nanmin(Z_adjusted)
-        z_max = np.nanmax(Z_adjusted)
-
-    heatmap = go.Heatmap(
-        x=x,
-        y=y,
-        z=Z_clipped,
-        colorscale=colorscale,
+    Z_clipped, z_min, z_max = _resolve_zrange(
+        Z_adjusted, z_range, z_axis_display, extrema,
+        in_place=not np.may_share_memory(Z_adjusted, flux),
+    )
+
+    sy, sx = _downsample_factors(Z_clipped.shape)
+    if sy > 1 or sx > 1:
+        logger.info(f"Downsampling heatmap by {sy}x{sx} (wavelength x time)")
+        x = _block_mean(x, sx, 0)
+        y = _block_mean(y, sy, 0)
+        Z_clipped = _downsample_2d(Z_clipped, sy, sx)
+        if errors_2d is not None:
+            errors_2d = _downsample_2d(np.asarray(errors_2d, dtype=float), sy, sx)
+
+    colorbar = dict(
+        title=dict(text=colorbar_title, font=dict(color='#ffffff')),
+        tickfont=dict(color='#ffffff'),
+        thickness=15,
+        len=0.8,
+        lenmode='fraction',
+        x=1.02,
+        y=0.5,
+    )
+    if colorbar_tickformat is not None:
+        colorbar['tickformat'] = colorbar_tickformat
+
+    heatmap = dict(
+        type='heatmap',
+        x=_plot_array(x),
+        y=_plot_array(y),
+        z=_plot_array(Z_clipped),
+        colorscale=_colorscale_spec(colorscale),
         zmin=z_min,
         zmax=z_max,
-        colorbar=dict(
-            title=colorbar_title,
-            titlefont=dict(color='#ffffff'),
-            tickfont=dict(color='#ffffff'),
-            thickness=15,
-            len=0.8,
-            lenmode='fraction',
-            x=1.02,
-            y=0.5,
-            tickformat=colorbar_tickformat,
-        ),
-        hovertemplate=(
-            'Time: %{x:.2f}<br>'
-            + wavelength_label + ': %{y:.4f}<br>'
-            + hover_z_label + ': %{z:' + hover_z_format + '}'
-            + hover_z_suffix + '<extra></extra>'
+        colorbar=colorbar,
+        hovertemplate=_HOVER_TEMPLATE.format(
+            wl=wavelength_label, label=hover_z_label,
+            fmt=hover_z_format, suffix=hover_z_suffix,
         ),
-        customdata=errors_2d,
     )
+    if errors_2d is not None:
+        heatmap['customdata'] = _plot_array(errors_2d)
     data = [heatmap]
 
     y_min, y_max = float(np.nanmin(y)), float(np.nanmax(y))
-    layout = go.Layout(
-        template='plotly_dark',
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#ffffff'),
-        title=dict(text=title, x=0.5),
-        xaxis=dict(title='Time (hours)', showspikes=False,
-                   gridcolor='#555555', linecolor='#555555', zeroline=False),
-        yaxis=dict(title=wavelength_label, showspikes=False,
-                   gridcolor='#555555', linecolor='#555555', zeroline=False,
-                   range=[y_min, y_max]),
-        margin=dict(l=20, r=20, b=60, t=60),
-        hovermode='closest',
-        showlegend=False,
-    )
-    fig = go.Figure(data=data, layout=layout)
-    return fig
+    axis = dict(showspikes=False, gridcolor='#555555', linecolor='#555555',
+                zeroline=False)
+    layout = {
+        **_LAYOUT_BASE,
+        'title': dict(text=title, x=0.5),
+        'xaxis': dict(title=dict(text='Time (hours)'), **axis),
+        'yaxis': dict(title=dict(text=wavelength_label), range=[y_min, y_max], **axis),
+        'margin': dict(l=20, r=20, b=60, t=60),
+    }
+    return {'data': data, 'layout': layout}
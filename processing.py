@@ -5,52 +5,120 @@ Numerical processing pipeline for JWST spectral time-series data.
 import os
 import logging
 import time as _time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 
 import numpy as np
-from scipy.stats import binned_statistic
-from scipy.ndimage import gaussian_filter
+from scipy.ndimage import gaussian_filter1d
 from scipy import interpolate
-from concurrent.futures import ThreadPoolExecutor
 from astropy.io import fits
 import h5py
 
 from data_io import (
     load_integrations_from_fits,
     load_integrations_from_h5,
+    _axis_mask,
     _first_key,
 )
 
 logger = logging.getLogger(__name__)
 
+# Files are opened and read concurrently; FITS/HDF5 I/O releases the GIL
+READ_WORKERS = 8
+# How often the reading loop reports progress while it waits on a file
+READ_PROGRESS_SECONDS = 0.25
+
 
 def calculate_bin_size(data_length, num_plots):
     """Return the binning factor to reduce data_length to ~num_plots bins."""
     return max(1, data_length // num_plots)
 
 
-def bin_flux_arr(fluxarr, bin_size):
-    """Median-bin a 2-D flux array along the time axis using a thread pool."""
-    try:
-        n_bins = fluxarr.shape[1] // bin_size
-        bin_edges = np.linspace(0, fluxarr.shape[1], n_bins + 1)
-
-        def bin_row(row):
-            return binned_statistic(
-                np.arange(len(row)), row, statistic='median', bins=bin_edges
-            )[0]
+def _block_mean(a, factor, axis):
+    """NaN-ignoring average of consecutive ``factor``-sample blocks along ``axis``.
 
-        with ThreadPoolExecutor() as executor:
-            fluxarrbin = np.array(list(executor.map(bin_row, fluxarr)))
+    Uses ``np.add.reduceat`` so a short trailing block is kept, not trimmed.
+    A block is NaN only if all of its samples are.
+    """
+    if a is None or factor <= 1:
+        return a
+    n = a.shape[axis]
+    starts = np.arange(0, n, factor)
+    valid = ~np.isnan(a)
+    if valid.all():
+        counts = np.diff(np.append(starts, n))
+        shape = [1] * a.ndim
+        shape[axis] = -1
+        return np.add.reduceat(a, starts, axis=axis) / counts.reshape(shape)
+    sums = np.add.reduceat(np.where(valid, a, 0.0), starts, axis=axis)
+    counts = np.add.reduceat(valid.astype(np.intp), starts, axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def wavelength_bin_factor(n_wl, target_n_wl):
+    """Rows per wavelength block that bring ``n_wl`` within ``target_n_wl``
+    (1 when no binning is needed or no target is given)."""
+    if not target_n_wl:
+        return 1
+    return max(1, -(-n_wl // target_n_wl))
+
+
+def bin_flux_arr(fluxarr, bin_size, bin_stat='median'):
+    """Median- or mean-bin a 2-D flux array along the time axis.
+
+    Bins match ``binned_statistic(..., statistic='median')`` over
+    ``np.linspace(0, n_time, n_bins + 1)`` edges, so every sample is used
+    even when ``n_time`` is not a multiple of ``bin_size``. Bins are
+    contiguous column ranges, so all bins of equal width are sorted and
+    reduced together as one gathered 3-D array.
+
+    ``bin_stat='mean'`` takes the NaN-ignoring mean of the same bins with
+    two ``np.add.reduceat`` passes and no sorting. It is much cheaper but
+    lets outliers (cosmic rays, bad frames) pull the bin, which the median
+    resists.
+    """
+    if bin_stat not in ('median', 'mean'):
+        raise ValueError(f"bin_stat must be 'median' or 'mean', got {bin_stat!r}")
+    try:
+        n_time = fluxarr.shape[1]
+        n_bins = n_time // bin_size
+        bin_edges = np.linspace(0, n_time, n_bins + 1)
+        if n_bins < 1:
+            raise ValueError(f"bin_size {bin_size} exceeds {n_time} time samples")
+        bin_ids = np.digitize(np.arange(n_time), bin_edges) - 1
+        counts = np.bincount(bin_ids, minlength=n_bins)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        if bin_stat == 'mean':
+            valid = ~np.isnan(fluxarr)
+            sums = np.add.reduceat(np.where(valid, fluxarr, 0.0), starts, axis=1)
+            n_valid = np.add.reduceat(valid.astype(np.intp), starts, axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return sums / n_valid
+
+        fluxarrbin = np.full((fluxarr.shape[0], n_bins), np.nan)
+        for width in np.unique(counts):
+            if width == 0:
+                continue
+            bins = np.flatnonzero(counts == width)
+            cols = starts[bins, None] + np.arange(width)
+            # binned_statistic's median: NaNs sort last but still count
+            srt = np.sort(fluxarr[:, cols], axis=2)
+            lo, hi = (width - 1) // 2, width // 2
+            fluxarrbin[:, bins] = (srt[..., lo] + srt[..., hi]) / 2
         return fluxarrbin
     except Exception as e:
         logger.error(f"Error in bin_flux_arr: {str(e)}")
         raise
 
 
-def smooth_flux(flux, sigma=2):
-    """Apply a Gaussian filter to a flux array."""
+def smooth_flux(flux, sigma=2, axis=1):
+    """Gaussian-smooth a flux array along one axis (time by default)."""
     try:
-        return gaussian_filter(flux, sigma=sigma)
+        if not sigma:
+            return flux
+        return gaussian_filter1d(flux, sigma=sigma, axis=axis, mode='nearest')
     except Exception as e:
         logger.error(f"Error in smooth_flux: {str(e)}")
         raise
@@ -58,8 +126,20 @@ def smooth_flux(flux, sigma=2):
 
 def process_data(flux, wavelength, time, num_plots, apply_binning=True,
                  smooth_sigma=2, wavelength_unit='um',
-                 z_axis_display='variability'):
-    """Prepare raw arrays for Plotly plotting: align, clean, bin, smooth, meshgrid."""
+                 z_axis_display='variability', target_n_wl=None,
+                 smooth_sigma_wl=0, bin_stat='median', errors=None):
+    """Prepare raw arrays for Plotly plotting: align, clean, bin, smooth, meshgrid.
+
+    ``smooth_sigma`` smooths along time only; the wavelength axis is at
+    instrument resolution and is left alone unless ``smooth_sigma_wl`` is
+    set. With ``target_n_wl``, wavelength rows are block-averaged down to
+    at most that many first (``smooth_sigma_wl`` is scaled to match).
+    ``errors`` (shaped like ``flux``) gets the same row trimming, masking,
+    sorting and binning, but no smoothing, so it stays aligned with Z.
+
+    Returns (x, y, X, Y, Z, wavelength_label, errors); errors is None when
+    none were given.
+    """
     try:
         logger.info('Shape before processing: %s', flux.shape)
         logger.info(f'Time array shape: {time.shape if hasattr(time, "shape") else len(time)}')
@@ -68,28 +148,43 @@ def process_data(flux, wavelength, time, num_plots, apply_binning=True,
         min_length = min(flux.shape[0], len(wavelength))
         flux = flux[:min_length]
         wavelength = np.asarray(wavelength[:min_length], dtype=float)
+        if errors is not None:
+            errors = np.asarray(errors, dtype=float)[:min_length]
 
         finite_mask = np.isfinite(wavelength)
         if not np.all(finite_mask):
             logger.info(f"Removing {np.count_nonzero(~finite_mask)} non-finite wavelength rows")
         wavelength = wavelength[finite_mask]
         flux = flux[finite_mask, :]
+        if errors is not None:
+            errors = errors[finite_mask, :]
 
         sort_idx = np.argsort(wavelength)
         if not np.all(sort_idx == np.arange(len(sort_idx))):
             logger.info("Sorting wavelengths to be strictly increasing")
         wavelength = wavelength[sort_idx]
         flux = flux[sort_idx, :]
+        if errors is not None:
+            errors = errors[sort_idx, :]
 
         if not isinstance(time, np.ndarray):
             time = np.array(time, dtype=float)
         else:
             time = time.astype(float)
 
+        wl_bin = wavelength_bin_factor(len(wavelength), target_n_wl)
+        if wl_bin > 1:
+            flux = _block_mean(flux, wl_bin, 0)
+            wavelength = _block_mean(wavelength, wl_bin, 0)
+            errors = _block_mean(errors, wl_bin, 0)
+            logger.info(f'Wavelength pre-binned by {wl_bin}: {flux.shape}')
+
         bin_size = calculate_bin_size(flux.shape[1], num_plots)
         logger.info(f'Calculated bin size: {bin_size}')
         if bin_size > 1 and apply_binning:
-            flux = bin_flux_arr(flux, bin_size)
+            flux = bin_flux_arr(flux, bin_size, bin_stat)
+            if errors is not None:
+                errors = bin_flux_arr(errors, bin_size, bin_stat)
             n_bins = flux.shape[1]
             bin_edges = np.linspace(0, len(time), n_bins + 1)
             bin_centers = ((bin_edges[:-1] + bin_edges[1:]) / 2).astype(int)
@@ -97,7 +192,9 @@ def process_data(flux, wavelength, time, num_plots, apply_binning=True,
             time = time[bin_centers]
             logger.info('Shape after binning: %s', flux.shape)
 
-        flux = smooth_flux(flux, sigma=smooth_sigma)
+        flux = smooth_flux(flux, sigma=smooth_sigma, axis=1)
+        if smooth_sigma_wl:
+            flux = smooth_flux(flux, sigma=smooth_sigma_wl / wl_bin, axis=0)
         logger.info('Shape after smoothing: %s', flux.shape)
 
         if wavelength_unit == 'nm':
@@ -110,18 +207,24 @@ def process_data(flux, wavelength, time, num_plots, apply_binning=True,
             wavelength_label = 'Wavelength (um)'
 
         x = time
-        logger.info(f'Time array after processing: min={np.nanmin(x):.4f}, max={np.nanmax(x):.4f}, shape={x.shape}')
+        # The range logs reduce whole arrays; skip them unless INFO is on
+        log_ranges = logger.isEnabledFor(logging.INFO)
+        if log_ranges:
+            logger.info('Time array after processing: min=%.4f, max=%.4f, shape=%s',
+                        np.nanmin(x), np.nanmax(x), x.shape)
         y = wavelength
         X, Y = np.meshgrid(x, y)
 
         if z_axis_display == 'flux':
             Z = flux
-            logger.info(f'Raw flux range: {np.nanmin(Z):.4e} to {np.nanmax(Z):.4e}')
+            if log_ranges:
+                logger.info('Raw flux range: %.4e to %.4e', np.nanmin(Z), np.nanmax(Z))
         else:
             Z = (flux - 1) * 100
-            logger.info(f'Variability range: {np.nanmin(Z):.2f}% to {np.nanmax(Z):.2f}%')
+            if log_ranges:
+                logger.info('Variability range: %.2f%% to %.2f%%', np.nanmin(Z), np.nanmax(Z))
 
-        return x, y, X, Y, Z, wavelength_label
+        return x, y, X, Y, Z, wavelength_label, errors
     except Exception as e:
         logger.error(f"Error in process_data: {str(e)}")
         raise
@@ -131,19 +234,18 @@ def identify_visits(times_hours, gap_threshold=0.5):
     """Segment a time series into visits (gaps > gap_threshold hours).
     Returns list of (start_idx, end_idx) pairs.
     """
-    if len(times_hours) == 0:
+    n = len(times_hours)
+    if n == 0:
         return []
-    visits = []
-    start_idx = 0
-    if len(times_hours) == 1:
+    if n == 1:
         return [(0, 1)]
-    for i in range(1, len(times_hours)):
-        time_gap = times_hours[i] - times_hours[i - 1]
-        if time_gap > gap_threshold:
-            visits.append((start_idx, i))
-            start_idx = i
-    visits.append((start_idx, len(times_hours)))
+    # A visit starts after every gap; one vectorised diff instead of a loop
+    starts = np.flatnonzero(np.diff(np.asarray(times_hours)) > gap_threshold) + 1
+    bounds = [0, *starts.tolist(), n]
+    visits = list(zip(bounds[:-1], bounds[1:]))
     logger.info(f"Identified {len(visits)} visits with gaps > {gap_threshold} hours")
+    if not logger.isEnabledFor(logging.INFO):
+        return visits
     for i, (start, end) in enumerate(visits):
         duration = times_hours[end - 1] - times_hours[start] if end > start else 0
         logger.info(
@@ -154,49 +256,169 @@ def identify_visits(times_hours, gap_threshold=0.5):
     return visits
 
 
+def _row_nanmedian(a):
+    """Per-row NaN-ignoring median of a 2-D array, shape ``(n_rows, 1)``.
+
+    Same values as ``np.nanmedian(a, axis=1, keepdims=True)``, which loops
+    over rows in Python for long rows; here one sort handles all rows.
+    """
+    ordered = np.sort(a, axis=1)  # NaNs sort to the end of each row
+    n_valid = np.count_nonzero(~np.isnan(a), axis=1)
+    lo = np.maximum((n_valid - 1) // 2, 0)[:, None]
+    hi = np.maximum(n_valid // 2, 0)[:, None]
+    med = (np.take_along_axis(ordered, lo, axis=1)
+           + np.take_along_axis(ordered, hi, axis=1)) / 2
+    med[n_valid == 0] = np.nan
+    return med
+
+
 def calculate_variability_from_raw_flux(flux_raw_2d):
     """Normalise raw flux per wavelength channel by its median (centered around 1.0)."""
-    median_flux_per_wavelength = np.nanmedian(flux_raw_2d, axis=1, keepdims=True)
-    median_flux_per_wavelength[median_flux_per_wavelength == 0] = 1.0
-    median_flux_per_wavelength[np.isnan(median_flux_per_wavelength)] = 1.0
+    # A finite sum means no NaN/inf anywhere, without an (n_wl, n_time)
+    # boolean temporary; an overflowing sum just takes the NaN-aware path.
+    if np.isfinite(flux_raw_2d.sum()):
+        median_flux_per_wavelength = np.median(flux_raw_2d, axis=1, keepdims=True)
+    else:
+        median_flux_per_wavelength = _row_nanmedian(flux_raw_2d)
+    median_flux_per_wavelength[
+        (median_flux_per_wavelength == 0) | np.isnan(median_flux_per_wavelength)
+    ] = 1.0
     flux_norm_2d = flux_raw_2d / median_flux_per_wavelength
     logger.info(f"Median flux per wavelength shape: {median_flux_per_wavelength.shape}")
-    logger.info(f"Normalized flux range: {np.nanmin(flux_norm_2d):.4f} to {np.nanmax(flux_norm_2d):.4f}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Normalized flux range: %.4f to %.4f",
+                    np.nanmin(flux_norm_2d), np.nanmax(flux_norm_2d))
     return flux_norm_2d
 
 
+def _interp_rows(x, xp, fp):
+    """``np.interp(x, xp, row, left=nan, right=nan)`` for every row of the
+    2-D ``fp`` at once, bit for bit: the same bracket, slope expression,
+    exact-node shortcut and NaN fallback, with the brackets found once."""
+    n = len(xp)
+    j = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, max(n - 2, 0))
+    x_lo = xp[j]
+    y_lo = fp[:, j]
+    if n < 2:
+        return np.where(x == x_lo, y_lo, np.nan)
+    y_hi = fp[:, j + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (y_hi - y_lo) / (xp[j + 1] - x_lo)
+        res = slope * (x - x_lo) + y_lo
+        bad = np.isnan(res)
+        if bad.any():
+            alt = slope * (x - xp[j + 1]) + y_hi
+            alt = np.where(np.isnan(alt) & (y_lo == y_hi), y_lo, alt)
+            res[bad] = alt[bad]
+    exact = x == x_lo
+    res[:, exact] = y_lo[:, exact]
+    res[:, x == xp[-1]] = fp[:, -1:]
+    res[:, (x < xp[0]) | (x > xp[-1])] = np.nan
+    return res
+
+
+def _linear_regrid(src_wl, new_wl, *arrays):
+    """Linearly interpolate each of ``arrays`` from ``src_wl`` onto ``new_wl``.
+
+    Matches ``interp1d(kind='linear', bounds_error=False, fill_value=np.nan)``
+    per array, including its dispatch: native float64 input goes through
+    ``np.interp``, anything else (e.g. big-endian FITS columns) through the
+    slope formula, with the bracketing indices computed once and shared by
+    all arrays (flux and error). Arrays may also be 2-D, one spectrum per
+    row on the shared ``src_wl``; the result then has one row per input row.
+    """
+    native = (np.dtype(np.float64), np.dtype(int))
+    src_wl = np.asarray(src_wl)
+    arrays = [np.asarray(a) for a in arrays]
+    if np.any(src_wl[1:] < src_wl[:-1]):
+        order = np.argsort(src_wl, kind='mergesort')
+        src_wl = src_wl[order]
+        arrays = [a[..., order] for a in arrays]
+
+    out = [None] * len(arrays)
+    slow = []
+    for i, y in enumerate(arrays):
+        if src_wl.dtype in native and y.dtype in native:
+            if y.ndim == 1:
+                out[i] = np.interp(new_wl, src_wl, y, left=np.nan, right=np.nan)
+            else:
+                out[i] = _interp_rows(new_wl, src_wl.astype(float), y.astype(float))
+        else:
+            slow.append(i)
+    if not slow:
+        return out
+
+    src_wl = src_wl.astype(float)
+    hi = np.clip(np.searchsorted(src_wl, new_wl), 1, len(src_wl) - 1)
+    lo = hi - 1
+    x_lo = src_wl[lo]
+    dx = new_wl - x_lo
+    span = src_wl[hi] - x_lo
+    outside = (new_wl < src_wl[0]) | (new_wl > src_wl[-1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in slow:
+            y = arrays[i].astype(float)
+            y_lo = y[..., lo]
+            res = (y[..., hi] - y_lo) / span * dx + y_lo
+            res[..., outside] = np.nan
+            out[i] = res
+    return out
+
+
+def _scan_file(fp):
+    """Return {path, count, first_t} for one FITS/H5 file without loading
+    its spectra; unreadable files get a count of 0."""
+    try:
+        if fp.endswith('.fits'):
+            with fits.open(fp, memmap=True) as hdul:
+                mids = hdul['INT_TIMES'].data['int_mid_MJD_UTC']
+                count = len(mids)
+                first_t = float(mids[0])
+        else:
+            with h5py.File(fp, 'r') as h:
+                names = set(h.keys())
+                fk = _first_key(names, "calibrated_optspec", "stdspec", "optspec")
+                count = h[fk].shape[0] if fk else 0
+                if 'time' in names:
+                    first_t = float(h['time'][0])
+                else:
+                    first_t = None
+        return {"path": fp, "count": int(count), "first_t": first_t}
+    except Exception as e:
+        logger.warning(f"Error scanning {os.path.basename(fp)}: {e}")
+        return {"path": fp, "count": 0, "first_t": None}
+
+
+def _read_file(i, total_files, fp, file_total, per_integ_cb):
+    """Load one scanned file. Returns (SpectralBlock, header_info) or
+    (None, None)."""
+    name = os.path.basename(fp)
+    logger.info("Processing file %d/%d: %s", i + 1, total_files, name)
+    logger.info("   Expected integrations: %d", file_total)
+    loader = load_integrations_from_fits if fp.endswith('.fits') else load_integrations_from_h5
+    block, header_info = loader(fp, per_integ_cb=per_integ_cb, total_in_file=file_total)
+    if block:
+        logger.info("   %s: %d integrations", name, len(block))
+    else:
+        logger.error(f"   No integrations returned from {name}!")
+    return block, header_info
+
+
 def process_mast_files_with_gaps(file_paths, use_interpolation=False,
-                                 progress_cb=None):
+                                 progress_cb=None, wavelength_range=None):
     """Run the full processing pipeline on FITS/H5 files.
     Stages: scan, read, regrid, (optional) interpolate, normalise.
+    If wavelength_range is given, only that part of the common grid is
+    regridded and normalised (same semantics as apply_data_ranges).
     Returns (common_wl, flux_norm_2d, flux_raw_2d, times_hours, metadata, error_raw_2d).
     """
     # Stage 1: Scan files
     if progress_cb:
         progress_cb(2.0, "Scanning files...", stage="scan")
 
-    scans = []
-    for fp in file_paths or []:
-        try:
-            if fp.endswith('.fits'):
-                with fits.open(fp, memmap=True) as hdul:
-                    mids = hdul['INT_TIMES'].data['int_mid_MJD_UTC']
-                    count = len(mids)
-                    first_t = float(mids[0])
-            elif fp.endswith('.h5'):
-                with h5py.File(fp, 'r') as h:
-                    fk = _first_key(h, "calibrated_optspec", "stdspec", "optspec")
-                    count = h[fk].shape[0] if fk else 0
-                    if 'time' in h:
-                        first_t = float(h['time'][0])
-                    else:
-                        first_t = None
-            else:
-                continue
-            scans.append({"path": fp, "count": int(count), "first_t": first_t})
-        except Exception as e:
-            logger.warning(f"Error scanning {os.path.basename(fp)}: {e}")
-            scans.append({"path": fp, "count": 0, "first_t": None})
+    paths = [fp for fp in file_paths or [] if fp.endswith(('.fits', '.h5'))]
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_WORKERS, len(paths)))) as pool:
+        scans = list(pool.map(_scan_file, paths))
 
     scans = [s for s in scans if s["count"] > 0]
     scans.sort(key=lambda d: (float('inf') if d["first_t"] is None else d["first_t"]))
@@ -216,7 +438,7 @@ def process_mast_files_with_gaps(file_paths, use_interpolation=False,
         )
 
     # Stage 2: Read integrations from each file
-    all_integrations = []
+    all_blocks = []
     all_headers = []
     processed_count = 0
     read_start, read_end = 10.0, 60.0
@@ -227,94 +449,92 @@ def process_mast_files_with_gaps(file_paths, use_interpolation=False,
         frac = processed / total_est_integrations
         return read_start + (read_end - read_start) * min(1.0, max(0.0, frac))
 
-    for i, s in enumerate(scans):
-        fp = s["path"]
-        file_total = s["count"]
-
-        logger.info(f"Processing file {i + 1}/{total_files}: {os.path.basename(fp)}")
-        logger.info(f"   Expected integrations: {file_total}")
+    # Workers only count; every progress_cb call below is made from this
+    # thread, so updates are never interleaved and never step backwards
+    count_lock = threading.Lock()
+    file_done = [0] * total_files
 
+    def make_per_integ_cb(i):
         def per_integ_cb(done_local, total_local):
             nonlocal processed_count
-            processed_count += 1
-            if progress_cb:
-                progress_cb(
-                    pct_for_read(processed_count),
-                    f"Reading {i + 1}/{total_files} - {done_local}/{file_total} integrations",
-                    stage="read",
-                    processed_integrations=processed_count,
-                    total_integrations=total_est_integrations,
-                )
-
-        if fp.endswith('.fits'):
-            logger.info(f"   Calling load_integrations_from_fits()...")
-            integrations, header_info = load_integrations_from_fits(
-                fp, per_integ_cb=per_integ_cb, total_in_file=file_total
-            )
-            logger.info(
-                f"   Returned: integrations="
-                f"{len(integrations) if integrations else 'None'}, "
-                f"header_info={'OK' if header_info else 'None'}"
-            )
-        elif fp.endswith('.h5'):
-            logger.info(f"   Calling load_integrations_from_h5()...")
-            integrations, header_info = load_integrations_from_h5(
-                fp, per_integ_cb=per_integ_cb, total_in_file=file_total
-            )
-            logger.info(
-                f"   Returned: integrations="
-                f"{len(integrations) if integrations else 'None'}, "
-                f"header_info={'OK' if header_info else 'None'}"
-            )
-        else:
-            logger.warning(f"   Skipping unknown file type")
-            integrations, header_info = (None, None)
-
-        if integrations:
-            logger.info(f"   Adding {len(integrations)} integrations")
-            all_integrations.extend(integrations)
-            all_headers.append(header_info)
-        else:
-            logger.error(f"   No integrations returned from this file!")
+            with count_lock:
+                processed_count += 1
+                file_done[i] = done_local
+        return per_integ_cb
 
+    def report_read(message):
         if progress_cb:
+            with count_lock:
+                done = processed_count
             progress_cb(
-                pct_for_read(processed_count),
-                f"Loaded {i + 1}/{total_files} files",
-                stage="read",
-                processed_integrations=processed_count,
+                pct_for_read(done), message, stage="read",
+                processed_integrations=done,
                 total_integrations=total_est_integrations,
             )
 
-    logger.info(f"Total integrations collected: {len(all_integrations)}")
-
-    if not all_integrations:
+    # Files are read concurrently but collected in scan order, so ties in
+    # the later time sort still resolve by file order.
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_WORKERS, total_files))) as pool:
+        futures = [
+            pool.submit(_read_file, i, total_files, s["path"], s["count"],
+                        make_per_integ_cb(i))
+            for i, s in enumerate(scans)
+        ]
+        for i, fut in enumerate(futures):
+            while True:
+                try:
+                    block, header_info = fut.result(timeout=READ_PROGRESS_SECONDS)
+                    break
+                except FuturesTimeout:
+                    report_read(f"Reading {i + 1}/{total_files} - "
+                                f"{file_done[i]}/{scans[i]['count']} integrations")
+            if block:
+                all_blocks.append(block)
+                all_headers.append(header_info)
+            report_read(f"Loaded {i + 1}/{total_files} files")
+        # Drop the futures' references so regridded blocks can be freed
+        futures = block = None
+
+    original_count = sum(len(b) for b in all_blocks)
+    logger.info(f"Total integrations collected: {original_count}")
+
+    if not all_blocks:
         raise ValueError("No valid integrations found in files")
 
-    all_integrations.sort(
-        key=lambda x: x['time'] if not hasattr(x['time'], 'mjd') else x['time'].mjd
-    )
-    original_count = len(all_integrations)
+    # Time order across files; stable like list.sort
+    times_arr = np.concatenate([b.times for b in all_blocks])
+    order = np.argsort(times_arr, kind='stable')
+    times_arr = times_arr[order]
 
     # Stage 3: Regrid to common wavelength grid
-    min_wl = max(np.min(integ['wavelength']) for integ in all_integrations)
-    max_wl = min(np.max(integ['wavelength']) for integ in all_integrations)
+    overlaps = [b.wavelength_overlap() for b in all_blocks]
+    min_wl = max(lo for lo, _ in overlaps)
+    max_wl = min(hi for _, hi in overlaps)
     if min_wl >= max_wl:
         raise ValueError(
             f"No wavelength overlap between files (min={min_wl:.4f}, max={max_wl:.4f}). "
             "Ensure all files cover a common wavelength range."
         )
-    native_counts = [len(integ['wavelength']) for integ in all_integrations]
+    native_counts = np.concatenate([b.point_counts() for b in all_blocks])
     n_wave = int(np.median(native_counts))
     n_wave = max(200, min(5000, n_wave))
     logger.info(f"Adaptive wavelength grid: {n_wave} points "
                 f"(native median: {int(np.median(native_counts))})")
     common_wl = np.linspace(min_wl, max_wl, n_wave)
-
-    flux_raw_list = []
-    error_raw_list = []
-    times = []
-    total_integ = len(all_integrations)
+    if wavelength_range:
+        # Channels are normalised independently, so trimming here is exact
+        wl_mask, _ = _axis_mask(
+            common_wl, wavelength_range, 'wavelength', 'Wavelength', 'um', '.3f',
+        )
+        common_wl = common_wl[wl_mask]
+        logger.info(f"Wavelength range pre-filter: {n_wave} -> {len(common_wl)} points")
+        n_wave = len(common_wl)
+
+    total_integ = original_count
+    # (n_wave, n_int) C-order: integrations land in columns, and the
+    # per-channel reductions downstream walk contiguous rows
+    flux_raw_2d = np.empty((n_wave, total_integ))
+    error_raw_2d = np.empty((n_wave, total_integ))
     regrid_start, regrid_end = 60.0, 88.0
 
     def pct_for_regrid(done):
@@ -332,43 +552,43 @@ def process_mast_files_with_gaps(file_paths, use_interpolation=False,
 
     t_start = _time.time()
 
-    for k, integ in enumerate(all_integrations):
-        f_interp = interpolate.interp1d(
-            integ['wavelength'],
-            integ['flux'],
-            kind='linear',
-            bounds_error=False,
-            fill_value=np.nan,
-        )
-        flux_raw_list.append(f_interp(common_wl))
-
-        if 'error' in integ and integ['error'] is not None:
-            e_interp = interpolate.interp1d(
-                integ['wavelength'],
-                integ['error'],
-                kind='linear',
-                bounds_error=False,
-                fill_value=np.nan,
-            )
-            error_raw_list.append(e_interp(common_wl))
-        else:
-            error_raw_list.append(np.full_like(common_wl, np.nan))
-
-        t = integ['time'].mjd if hasattr(integ['time'], 'mjd') else integ['time']
-        times.append(t)
+    # Column of each (block, row) in the time-ordered output
+    column = np.empty(total_integ, dtype=np.intp)
+    column[order] = np.arange(total_integ)
+    done = 0
 
+    def report(done):
         if progress_cb:
             progress_cb(
-                pct_for_regrid(k + 1),
-                f"Regridding {k + 1}/{total_integ} integrations",
+                pct_for_regrid(done),
+                f"Regridding {done}/{total_integ} integrations",
                 stage="regrid",
-                processed_integrations=k + 1,
+                processed_integrations=done,
                 total_integrations=total_integ,
             )
 
-    flux_raw_2d = np.array(flux_raw_list).T
-    error_raw_2d = np.array(error_raw_list).T
-    times_arr = np.array(times)
+    # Blocks are regridded straight into their columns and released one at
+    # a time, so raw spectra and the regridded buffers are never both held
+    # in full
+    for bi in range(len(all_blocks)):
+        b = all_blocks[bi]
+        all_blocks[bi] = None
+        cols = column[done:done + len(b)]
+        if b.valid is None and b.wavelength.ndim == 1:
+            # One shared unmasked grid: all rows in one call
+            flux, err = _linear_regrid(b.wavelength, common_wl, b.flux2d, b.errors2d)
+            flux_raw_2d[:, cols] = flux.T
+            error_raw_2d[:, cols] = err.T
+            done += len(b)
+            report(done)
+        else:
+            for i, k in enumerate(cols):
+                wl, flux, err = b.row(i)
+                flux_raw_2d[:, k], error_raw_2d[:, k] = _linear_regrid(wl, common_wl, flux, err)
+                done += 1
+                report(done)
+        del b, flux, err
+
     t0 = times_arr.min()
     times_hours = (times_arr - t0) * 24.0
 
@@ -378,27 +598,15 @@ def process_mast_files_with_gaps(file_paths, use_interpolation=False,
             progress_cb(88.0, "Interpolating across time...", stage="interpolate")
 
         time_grid = np.linspace(times_hours.min(), times_hours.max(), len(times_hours))
-        flux_raw_interpolated = np.zeros((flux_raw_2d.shape[0], len(time_grid)))
-        error_raw_interpolated = np.zeros((error_raw_2d.shape[0], len(time_grid)))
-
-        for i in range(flux_raw_2d.shape[0]):
-            f_raw_interp = interpolate.interp1d(
-                times_hours, flux_raw_2d[i, :], kind='linear',
-                bounds_error=False, fill_value='extrapolate',
-            )
-            e_raw_interp = interpolate.interp1d(
-                times_hours, error_raw_2d[i, :], kind='linear',
-                bounds_error=False, fill_value='extrapolate',
-            )
-            flux_raw_interpolated[i, :] = f_raw_interp(time_grid)
-            error_raw_interpolated[i, :] = e_raw_interp(time_grid)
-
-            if progress_cb and i % 50 == 0:
-                progress_cb(
-                    88.0 + 4.0 * (i / max(1, flux_raw_2d.shape[0])),
-                    "Interpolating across time...",
-                    stage="interpolate",
-                )
+        # One interpolator over the time axis of the whole 2-D array
+        flux_raw_interpolated = interpolate.interp1d(
+            times_hours, flux_raw_2d, kind='linear', axis=1,
+            bounds_error=False, fill_value='extrapolate',
+        )(time_grid)
+        error_raw_interpolated = interpolate.interp1d(
+            times_hours, error_raw_2d, kind='linear', axis=1,
+            bounds_error=False, fill_value='extrapolate',
+        )(time_grid)
 
         flux_raw_2d = flux_raw_interpolated
         error_raw_2d = error_raw_interpolated
@@ -414,16 +622,26 @@ def process_mast_files_with_gaps(file_paths, use_interpolation=False,
 
     flux_norm_2d = calculate_variability_from_raw_flux(flux_raw_2d)
 
+    # Dicts as ordered sets: values listed in file order, stable across runs
+    targets, instruments, filters, gratings = {}, {}, {}, {}
+    for h in all_headers:
+        if not h:
+            continue
+        targets[h['target']] = None
+        instruments[h['instrument']] = None
+        filters[h['filter']] = None
+        gratings[h['grating']] = None
+
     metadata = {
         'total_integrations': original_count,
         'plotted_integrations': original_count,
         'files_processed': len(file_paths),
         'wavelength_range': f"{common_wl.min():.3f}-{common_wl.max():.3f} um",
         'time_range': f"{times_hours.min():.2f}-{times_hours.max():.2f} hours",
-        'targets': list(set(h['target'] for h in all_headers if h)),
-        'instruments': list(set(h['instrument'] for h in all_headers if h)),
-        'filters': list(set(h['filter'] for h in all_headers if h)),
-        'gratings': list(set(h['grating'] for h in all_headers if h)),
+        'targets': list(targets),
+        'instruments': list(instruments),
+        'filters': list(filters),
+        'gratings': list(gratings),
         'flux_unit': all_headers[0]['flux_unit'] if all_headers else 'Unknown',
     }
 
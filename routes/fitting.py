@@ -10,7 +10,7 @@ import numpy as np
 from flask import Blueprint, request, jsonify
 
 from config import GRIDS_DIR
-from state import _progress_set, RESULTS, PROG_LOCK
+from state import _progress_set, RESULTS
 from fitting import (
     fit_sinusoidal,
     fit_sinusoidal_all_wavelengths,
@@ -77,8 +77,7 @@ def fit_sine_sweep():
                     progress_cb=cb,
                 )
 
-                with PROG_LOCK:
-                    RESULTS[job_id] = result
+                RESULTS[job_id] = result
 
                 _progress_set(job_id, percent=100.0, message="Done",
                                status="done", stage="done")
@@ -183,8 +182,7 @@ def fit_grid_sweep():
                     progress_cb=cb,
                 )
 
-                with PROG_LOCK:
-                    RESULTS[job_id] = result
+                RESULTS[job_id] = result
 
                 _progress_set(job_id, percent=100.0, message="Done",
                                status="done", stage="done")
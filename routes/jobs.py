@@ -1,69 +1,133 @@
 """Background job management routes for async MAST data processing."""
 
+import io
 import os
+import gzip
 import json
-import copy
 import shutil
-import zipfile
+import atexit
 import tempfile
-import threading
 import uuid
+import hashlib
 import logging
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-import numpy as np
-import plotly.io as pio
-from flask import Blueprint, request, jsonify
-from astropy.io import fits
-import h5py
+import orjson
+from flask import Blueprint, Response, request, jsonify
 
 import state
-from state import _progress_set, PROGRESS, RESULTS, PROG_LOCK, cache
+from state import _progress_set, PROGRESS, RESULTS
 from config import BASE_DIR, DEMO_DATA_DIR
-from data_io import apply_data_ranges, _first_key
+from data_io import (
+    extract_spectral_files,
+    sort_files_by_start_time,
+    _first_key,
+)
 from processing import process_mast_files_with_gaps
-from plotting import create_surface_plot_with_visits, create_heatmap_plot
+from mast_payload import build_plot_payload
 
 logger = logging.getLogger(__name__)
 
+# Bounded pool for background jobs: bursts of uploads queue here (reported
+# as "Queued…") instead of each spawning a new thread.
+EXECUTOR = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2),
+                              thread_name_prefix='mast-job')
+atexit.register(EXECUTOR.shutdown, wait=False)
+
 jobs_bp = Blueprint('jobs', __name__)
 
 
+# Time order of the spectra in recently seen archives, keyed by a digest
+# of the ZIP central directory: member paths relative to the work dir
+_SORT_ORDER_MAX = 64
+_sort_orders = OrderedDict()
+_sort_orders_lock = threading.Lock()
+
+
 def _extract_and_sort(zip_path, work_dir):
-    """Extract a ZIP archive and return FITS/H5 paths sorted by observation time."""
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(work_dir)
-
-    fits_files = []
-    for root, _, files in os.walk(work_dir):
-        for f in files:
-            if f.lower().endswith(('.fits', '.h5')):
-                fits_files.append(os.path.join(root, f))
-
-    file_times = []
-    for fp in fits_files:
-        try:
-            if fp.endswith('.fits'):
-                with fits.open(fp) as hdul:
-                    t = hdul['INT_TIMES'].data['int_mid_MJD_UTC'][0]
-            elif fp.endswith('.h5'):
-                with h5py.File(fp, 'r') as h:
-                    t = float(h['time'][0]) if 'time' in h else None
-            else:
-                t = None
-            if t is not None:
-                file_times.append((fp, t))
-        except Exception:
-            continue
-    return [fp for fp, _ in sorted(file_times, key=lambda x: x[1])]
+    """Extract a ZIP archive and return FITS/H5 paths sorted by observation time.
+
+    The order is memoised on the archive's central directory (name, CRC-32
+    and size of every member), so re-uploads of the same data still extract
+    but skip reading every file's start time.
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        members = [(i.filename, i.CRC, i.file_size) for i in z.infolist()]
+    key = hashlib.blake2b(repr(members).encode(), digest_size=16).digest()
+    with _sort_orders_lock:
+        order = _sort_orders.get(key)
+        if order is not None:
+            _sort_orders.move_to_end(key)
+
+    paths = extract_spectral_files(zip_path, work_dir)
+    if order is not None:
+        by_rel = {os.path.relpath(p, work_dir): p for p in paths}
+        return [by_rel[rel] for rel in order if rel in by_rel]
+
+    paths = sort_files_by_start_time(paths)
+    with _sort_orders_lock:
+        _sort_orders[key] = [os.path.relpath(p, work_dir) for p in paths]
+        if len(_sort_orders) > _SORT_ORDER_MAX:
+            _sort_orders.popitem(last=False)
+    return paths
+
+
+_GZIP_MIN_BYTES = 1024
+
+
+def _json_response(obj):
+    """Encode ``obj`` with orjson, gzip-compressed when the client accepts it.
+
+    Result payloads are several MB of numeric JSON, which both encodes far
+    faster with orjson than with jsonify and shrinks well on the wire.
+    """
+    body = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    resp = Response(body, mimetype='application/json')
+    resp.vary.add('Accept-Encoding')
+    if len(body) >= _GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        resp.set_data(gzip.compress(body, compresslevel=1))
+        resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+
+def _detach_upload(file_storage):
+    """Return a readable file object for an upload that outlives the request.
+
+    Werkzeug closes the upload's stream at request teardown; a duplicated
+    descriptor keeps the data readable from the job thread without copying
+    it in the request handler. Its default stream is a SpooledTemporaryFile,
+    whose fileno() first rolls an in-memory upload over to disk, so in
+    practice every upload is dup'd; the read-out fallback only covers
+    streams with no descriptor at all. The caller owns (and must close) the
+    returned file.
+    """
+    stream = file_storage.stream
+    try:
+        src = os.fdopen(os.dup(stream.fileno()), 'rb')
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return io.BytesIO(file_storage.read())
+    src.seek(0)
+    return src
+
 
+def _run_mast_job(job_id, zip_path, form_args, upload=None):
+    """Background worker: process a MAST zip through the full pipeline and store results.
 
-def _run_mast_job(job_id, zip_path, form_args):
-    """Background worker: process a MAST zip through the full pipeline and store results."""
+    If ``upload`` is given, it is first written to ``zip_path`` on this thread.
+    """
     _progress_set(job_id, reset=True, percent=1.0, message="Queued…", stage="queued")
     temp_dir = tempfile.mkdtemp(prefix=f"mast_job_{job_id[:8]}_")
     is_demo = form_args.get("is_demo", False)
 
     try:
+        if upload is not None:
+            _progress_set(job_id, percent=1.0, message="Saving upload…", stage="uploading")
+            with upload, open(zip_path, 'wb') as dst:
+                shutil.copyfileobj(upload, dst, 1024 * 1024)
+
         use_interpolation = form_args["use_interpolation"]
         num_integrations = form_args["num_integrations"]
 
@@ -78,7 +142,7 @@ def _run_mast_job(job_id, zip_path, form_args):
         logger.info(f"   interpolation: {use_interpolation}")
         logger.info(f"   num_integrations: {num_integrations}")
 
-        cached_data = cache.get(cache_key_path, use_interpolation)
+        cached_data = state.cache.get(cache_key_path, use_interpolation, full_hash=not is_demo)
 
         if cached_data:
             logger.info(f"Job {job_id[:8]}: Cache HIT!")
@@ -90,15 +154,14 @@ def _run_mast_job(job_id, zip_path, form_args):
 
             _progress_set(job_id, percent=60.0, message="Loaded from cache", stage="read")
 
-            # Deep-copy so mutations don't corrupt the cache
-            wavelength_1d = cached_data['wavelength_1d'].copy()
-            flux_norm_2d = cached_data['flux_norm_2d'].copy()
-            flux_raw_2d = cached_data['flux_raw_2d'].copy()
-            time_1d = cached_data['time_1d'].copy()
-            metadata = copy.deepcopy(cached_data['metadata'])
-            error_raw_2d = cached_data['error_raw_2d'].copy()
-
-            logger.info(f"   Data copied from cache")
+            # cache.get() deserializes a fresh payload on every hit, so these
+            # arrays and the metadata dict are this job's own to modify
+            wavelength_1d = cached_data['wavelength_1d']
+            flux_norm_2d = cached_data['flux_norm_2d']
+            flux_raw_2d = cached_data['flux_raw_2d']
+            time_1d = cached_data['time_1d']
+            metadata = cached_data['metadata']
+            error_raw_2d = cached_data['error_raw_2d']
 
         else:
             logger.info(f"Job {job_id[:8]}: Cache MISS - processing from scratch")
@@ -144,7 +207,7 @@ def _run_mast_job(job_id, zip_path, form_args):
                 'error_raw_2d': error_raw_2d,
             }
 
-            cache.set(cache_key_path, use_interpolation, cache_data)
+            state.cache.set(cache_key_path, use_interpolation, cache_data, full_hash=not is_demo)
             logger.info(f"Data cached successfully")
 
         logger.info(f"Job {job_id[:8]}: Data state after cache retrieval:")
@@ -175,117 +238,22 @@ def _run_mast_job(job_id, zip_path, form_args):
             logger.info(f"   Sampled to {len(time_1d)} integrations")
             logger.info(f"   New flux shape: {flux_raw_2d.shape}")
 
-        # Stage 6: Filter — apply user-specified ranges
-        _progress_set(job_id, percent=95.0, message="Applying filters…", stage="finalize")
-
-        custom_bands = form_args["custom_bands"]
-        colorscale = form_args["colorscale"]
-        z_axis_display = form_args["z_axis_display"]
-        time_range = form_args["time_range"]
-        wavelength_range = form_args["wavelength_range"]
-        variability_range = form_args["variability_range"]
+        # Stages 6-7: Filter and plot
+        def finalize_cb(pct, msg):
+            _progress_set(job_id, percent=pct, message=msg, stage="finalize")
 
-        range_info = []
-        if wavelength_range or time_range:
-            wavelength_1d_norm, flux_norm_2d_filtered, time_1d_norm, range_info = apply_data_ranges(
-                wavelength_1d, flux_norm_2d, time_1d, wavelength_range, time_range,
-            )
-            wavelength_1d_raw, flux_raw_2d_filtered, time_1d_raw, _ = apply_data_ranges(
-                wavelength_1d, flux_raw_2d, time_1d, wavelength_range, time_range,
-            )
-            wavelength_1d_err, error_raw_2d_filtered, time_1d_err, _ = apply_data_ranges(
-                wavelength_1d, error_raw_2d, time_1d, wavelength_range, time_range,
-            )
-            logger.info(f"   Ranges applied: {'; '.join(range_info)}")
-        else:
-            wavelength_1d_norm, flux_norm_2d_filtered, time_1d_norm = wavelength_1d, flux_norm_2d, time_1d
-            wavelength_1d_raw, flux_raw_2d_filtered, time_1d_raw = wavelength_1d, flux_raw_2d, time_1d
-            wavelength_1d_err, error_raw_2d_filtered, time_1d_err = wavelength_1d, error_raw_2d, time_1d
-            logger.info(f"   No range filtering applied")
-
-        metadata['user_ranges'] = '; '.join(range_info) if range_info else None
-
-        logger.info(f"Job {job_id[:8]}: Final data for plotting:")
-        logger.info(f"   time_1d_norm length: {len(time_1d_norm)}")
-        logger.info(f"   time_1d_norm range: {time_1d_norm.min():.2f} to {time_1d_norm.max():.2f} hours")
-        logger.info(f"   flux shape: {flux_norm_2d_filtered.shape}")
-
-        # Choose Z data based on display mode
-        if z_axis_display == 'flux':
-            z_data = flux_raw_2d_filtered
-            errors_for_plot = error_raw_2d_filtered
-        else:
-            z_data = flux_norm_2d_filtered
-            median_per_wl = np.nanmedian(flux_raw_2d_filtered, axis=1, keepdims=True)
-            median_per_wl[median_per_wl == 0] = 1.0
-            errors_for_plot = (error_raw_2d_filtered / median_per_wl) * 100
-
-        ref_spec = np.nanmedian(np.asarray(flux_raw_2d_filtered), axis=1)
-
-        # Stage 7: Plot
-        with PROG_LOCK:
-            prev = PROGRESS.get(job_id, {})
-            pi = prev.get("processed_integrations", 0)
-            ti = prev.get("total_integrations", None)
-        _progress_set(
-            job_id, percent=96.0, message="Rendering plots…", stage="finalize",
-            processed_integrations=pi,
-            total_integrations=ti,
-        )
-
-        surface_plot = create_surface_plot_with_visits(
-            z_data,
-            wavelength_1d_norm if z_axis_display != 'flux' else wavelength_1d_raw,
-            time_1d_norm if z_axis_display != 'flux' else time_1d_raw,
-            '3D Surface Plot',
-            num_plots=1000,
-            smooth_sigma=2,
-            wavelength_unit='um',
-            custom_bands=custom_bands,
-            colorscale=colorscale,
-            z_range=variability_range,
-            z_axis_display=z_axis_display,
-            flux_unit=metadata.get('flux_unit', 'Unknown'),
-            errors_2d=errors_for_plot,
-        )
-
-        heatmap_plot = create_heatmap_plot(
-            z_data,
-            wavelength_1d_norm if z_axis_display != 'flux' else wavelength_1d_raw,
-            time_1d_norm if z_axis_display != 'flux' else time_1d_raw,
-            'Heatmap',
-            num_plots=1000,
-            smooth_sigma=2,
-            wavelength_unit='um',
-            custom_bands=custom_bands,
-            colorscale=colorscale,
-            z_range=variability_range,
-            z_axis_display=z_axis_display,
-            flux_unit=metadata.get('flux_unit', 'Unknown'),
-            errors_2d=error_raw_2d_filtered,
+        payload = build_plot_payload(
+            wavelength_1d, flux_norm_2d, flux_raw_2d, time_1d, metadata, error_raw_2d,
+            form_args, progress_cb=finalize_cb, include_raw=True,
         )
 
         # Store plot data in shared state for /download_plots
-        state.last_surface_plot_html = pio.to_html(surface_plot, include_plotlyjs='cdn', full_html=True)
-        state.last_heatmap_plot_html = pio.to_html(heatmap_plot, include_plotlyjs='cdn', full_html=True)
-        state.last_surface_fig_json = surface_plot.to_plotly_json()
-        state.last_heatmap_fig_json = heatmap_plot.to_plotly_json()
-        state.last_custom_bands = custom_bands
+        state.last_surface_fig_json = payload['surface_plot']
+        state.last_heatmap_fig_json = payload['heatmap_plot']
+        state.last_custom_bands = form_args["custom_bands"]
 
         # Stage 8: Store results
-        payload = {
-            'surface_plot': surface_plot.to_json(),
-            'heatmap_plot': heatmap_plot.to_json(),
-            'metadata': metadata,
-            'reference_spectrum': json.dumps(ref_spec.tolist()),
-            'raw_flux_2d': json.dumps(np.asarray(flux_raw_2d_filtered).tolist()),
-            'raw_error_2d': json.dumps(np.asarray(error_raw_2d_filtered).tolist()),
-            'raw_wavelengths': json.dumps(np.asarray(wavelength_1d_raw).tolist()),
-            'raw_time': json.dumps(np.asarray(time_1d_raw).tolist()),
-        }
-
-        with PROG_LOCK:
-            RESULTS[job_id] = payload
+        RESULTS[job_id] = payload
 
         logger.info(f"Job {job_id[:8]}: Completed successfully")
         _progress_set(job_id, percent=100.0, message="Done", status="done", stage="done")
@@ -316,13 +284,13 @@ def start_mast():
             if not os.path.exists(demo_zip):
                 return jsonify({'error': 'Demo dataset not found. Please upload your own data.'}), 404
             tmp_zip = demo_zip
+            mast_file = None
             logger.info(f"Using demo dataset at {demo_zip}")
         else:
             mast_file = request.files.get('mast_zip')
             if not mast_file or mast_file.filename == '':
                 return jsonify({'error': 'No MAST zip file provided'}), 400
             tmp_zip = os.path.join(tempfile.gettempdir(), f"mast_job_{uuid.uuid4().hex}.zip")
-            mast_file.save(tmp_zip)
             logger.info(f"Processing uploaded file: {mast_file.filename}")
 
         # Parse form parameters
@@ -360,7 +328,7 @@ def start_mast():
             v_max = float(variability_range_max) if variability_range_max else None
             variability_range = (v_min, v_max)
 
-        # Spawn background thread
+        # Queue background job
         job_id = uuid.uuid4().hex
         _progress_set(job_id, reset=True, percent=1.0, message="Queued…", stage="queued")
         form_args = {
@@ -374,8 +342,14 @@ def start_mast():
             "variability_range": variability_range,
             "is_demo": use_demo,
         }
-        t = threading.Thread(target=_run_mast_job, args=(job_id, tmp_zip, form_args), daemon=True)
-        t.start()
+        # Detached only once the form has parsed, so a 400 leaks no descriptor
+        upload = _detach_upload(mast_file) if mast_file is not None else None
+        try:
+            EXECUTOR.submit(_run_mast_job, job_id, tmp_zip, form_args, upload)
+        except Exception:
+            if upload is not None:
+                upload.close()
+            raise
         return jsonify({"job_id": job_id}), 202
 
     except Exception as e:
@@ -386,20 +360,18 @@ def start_mast():
 @jobs_bp.route('/progress/<job_id>')
 def get_progress(job_id):
     """Return the current progress record for a background job."""
-    with PROG_LOCK:
-        if job_id not in PROGRESS:
-            return jsonify({"error": "unknown job"}), 404
-        out = dict(PROGRESS[job_id])
-    return jsonify(out)
+    rec = PROGRESS.get(job_id)
+    if rec is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(rec)
 
 
 @jobs_bp.route('/results/<job_id>')
 def get_results(job_id):
     """Return the final result payload once a background job has completed."""
-    with PROG_LOCK:
-        if job_id not in PROGRESS:
-            return jsonify({"error": "unknown job"}), 404
-        rec = dict(PROGRESS[job_id])
+    rec = PROGRESS.get(job_id)
+    if rec is None:
+        return jsonify({"error": "unknown job"}), 404
     if rec.get("status") == "error":
         return jsonify({"error": rec.get("message", "processing error")}), 500
     if rec.get("status") != "done":
@@ -407,4 +379,4 @@ def get_results(job_id):
     payload = RESULTS.get(job_id)
     if not payload:
         return jsonify({"error": "no payload"}), 500
-    return jsonify(payload)
+    return _json_response(payload)
@@ -10,22 +10,34 @@ import time as _time
 
 from cache_manager import DatasetCache
 
-# Background-job tracking
+# Background-job tracking. Records are replaced, never mutated, so readers
+# can use PROGRESS.get(job_id) without a lock: CPython dict item assignment
+# is atomic. Writers serialise their read-copy-publish on _progress_lock so
+# concurrent updates to one job are never lost.
 PROGRESS = {}          # job_id -> progress record dict
+_progress_lock = threading.Lock()
 RESULTS = {}           # job_id -> completed result payload dict
-PROG_LOCK = threading.Lock()
 
-# Dataset cache (disk-backed, LRU, 24-hour TTL, 10 GB cap)
-cache = DatasetCache(ttl_hours=24, max_cache_size_gb=10)
+# Dataset cache (disk-backed, LRU, 24-hour TTL, 10 GB cap), created on
+# first use as ``state.cache``: spawned worker processes that import this
+# module indirectly then never open the index or start a writer thread
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def __getattr__(name):
+    global _cache
+    if name == 'cache':
+        with _cache_lock:
+            if _cache is None:
+                _cache = DatasetCache(ttl_hours=24, max_cache_size_gb=10)
+        return _cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Latest plot objects shared between route handlers
-latest_surface_figure = None
-latest_heatmap_figure = None
 latest_spectrum_video_path = None
 
-last_surface_plot_html = None
-last_heatmap_plot_html = None
-last_surface_fig_json = None
+last_surface_fig_json = None    # encoded figure JSON strings
 last_heatmap_fig_json = None
 last_custom_bands = []
 latest_spectrum_mp4_path = None
@@ -37,12 +49,15 @@ video_tmp_paths = {}
 def _progress_set(job_id, *, percent=None, message=None, status=None,
                   reset=False, stage=None, processed_integrations=None,
                   total_integrations=None):
-    """Create or update a background-job progress record (thread-safe).
-    Returns a snapshot copy of the record.
+    """Create or update a background-job progress record.
+
+    Builds a new record and publishes it with a single assignment, under
+    a writer lock; readers need no lock. Returns the published record,
+    which must not be mutated.
     """
-    with PROG_LOCK:
-        rec = PROGRESS.get(job_id)
-        if reset or rec is None:
+    with _progress_lock:
+        prev = PROGRESS.get(job_id)
+        if reset or prev is None:
             rec = {
                 "status": "running",
                 "percent": 0.0,
@@ -52,7 +67,8 @@ def _progress_set(job_id, *, percent=None, message=None, status=None,
                 "processed_integrations": 0,
                 "total_integrations": None,
             }
-            PROGRESS[job_id] = rec
+        else:
+            rec = dict(prev)
 
         if percent is not None:
             p = float(percent)
@@ -71,26 +87,26 @@ def _progress_set(job_id, *, percent=None, message=None, status=None,
         if total_integrations is not None:
             rec["total_integrations"] = int(total_integrations)
 
-        if status == "done":
-            _cleanup_old_jobs()
+        PROGRESS[job_id] = rec
 
-        return rec.copy()
+    if status == "done":
+        _cleanup_old_jobs()
+
+    return rec
 
 
 _MAX_JOB_AGE = 3600  # 1 hour
 
 
 def _cleanup_old_jobs():
-    """Remove completed/errored jobs older than _MAX_JOB_AGE seconds.
-
-    Must be called while PROG_LOCK is held.
-    """
+    """Remove completed/errored jobs older than _MAX_JOB_AGE seconds."""
     now = _time.time()
     stale = [
-        jid for jid, rec in PROGRESS.items()
+        jid for jid, rec in list(PROGRESS.items())
         if rec.get("status") in ("done", "error")
         and now - rec.get("started_at", now) > _MAX_JOB_AGE
     ]
-    for jid in stale:
-        PROGRESS.pop(jid, None)
-        RESULTS.pop(jid, None)
+    with _progress_lock:
+        for jid in stale:
+            PROGRESS.pop(jid, None)
+            RESULTS.pop(jid, None)
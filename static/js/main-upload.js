@@ -269,7 +269,7 @@ async function uploadMastDirectory() {
           const r = await fetch(`/progress/${__currentJobId}`);
           if (!r.ok) { const et = await r.text(); throw new Error(et || 'progress error'); }
           const p = await r.json();
-          const stageMap = { queued:'Queued', scan:'Scanning files', read:'Reading data', regrid:'Regridding wavelengths', interpolate:'Interpolating gaps', finalize:'Finalizing', done:'Done', error:'Error' };
+          const stageMap = { queued:'Queued', uploading:'Saving upload', scan:'Scanning files', read:'Reading data', regrid:'Regridding wavelengths', interpolate:'Interpolating gaps', finalize:'Finalizing', done:'Done', error:'Error' };
           const stageLabel = stageMap[p.stage] || (p.stage || '');
           const proc = typeof p.processed_integrations === 'number' ? p.processed_integrations : null;
           const tot = typeof p.total_integrations === 'number' ? p.total_integrations : null;